@@ -1,117 +1,76 @@
 import numpy as np
-import hashlib
-import json
+import time
 from connect4.policy import Policy
+from policy import (
+    COLS, SearchTree, board_to_bitboards, canonical_key, last_move_wins,
+    legal_moves, move_index, position_key,
+)
+from qtable import BoundedQTable, QTable
 
 
 class ALjuriRuiz(Policy):
 
-    def __init__(self, gamma=0.99, q_filename=None):
-        self.Q = {}
-        self.N = {}
+    ITER = 10           # iteraciones MCTS por jugada si no hay time_out
+    TIME_MARGIN = 0.15  # fracción del time_out que se deja libre por seguridad
+
+    def __init__(self, gamma=0.99, q_filename=None, max_states=None):
+        # estado -> vector Q y vector N de 7 acciones; con max_states la
+        # tabla tiene tamaño fijo y desaloja los estados menos visitados
+        if max_states is None:
+            self.table = QTable()
+        else:
+            self.table = BoundedQTable(max_states)
         self.episode = []
         self.gamma = gamma
+        self.tree = SearchTree()
+        self.time_out = None
+        self.search_log = []   # (iteraciones, segundos) de cada búsqueda
 
-        # Cargar memoria si se pasa un JSON
+        # Cargar memoria si se pasa una Q-table (.bin, o .json anterior)
         if q_filename is not None:
             try:
-                with open(q_filename, "r") as f:
-                    data = json.load(f)
-                for key, val in data["Q"].items():
-                    s, a = key.split("|")
-                    self.Q[(s, int(a))] = val
-                for key, val in data["N"].items():
-                    s, a = key.split("|")
-                    self.N[(s, int(a))] = val
-                print("[INFO] Memoria cargada con", len(self.Q), "entradas")
+                self.load(q_filename)
+                print("[INFO] Memoria cargada con", len(self.table), "estados")
             except:
-                print("[WARNING] No se encontró el JSON. Empezando desde cero.")
+                print(f"[WARNING] No se encontró {q_filename}. Empezando desde cero.")
 
     # ------------------------------
     # Utils
     # ------------------------------
 
     def encode(self, board):
-        return hashlib.sha1(board.tobytes()).hexdigest()
-
-    def save(self, path="Q_table.json"):
-        data = {
-            "Q": {f"{k[0]}|{k[1]}": v for k, v in self.Q.items()},
-            "N": {f"{k[0]}|{k[1]}": v for k, v in self.N.items()},
-        }
-        with open(path, "w") as f:
-            json.dump(data, f)
-
-    def load(self, path="Q_table.json"):
-        with open(path, "r") as f:
-            data = json.load(f)
-        self.Q.clear()
-        self.N.clear()
-        for key, val in data["Q"].items():
-            s, a = key.split("|")
-            self.Q[(s, int(a))] = val
-        for key, val in data["N"].items():
-            s, a = key.split("|")
-            self.N[(s, int(a))] = val
+        red, yellow, _ = board_to_bitboards(board)
+        return canonical_key(position_key(red, yellow))[0]
+
+    def save(self, path="Q_table.bin"):
+        self.table.save(path)
+
+    def load(self, path="Q_table.bin"):
+        self.table.load(path)
 
     def mount(self, time_out=None):
         self.episode = []
+        self.time_out = time_out
+        self.tree.clear()
 
     # ------------------------------
     # Immediate Tactics (WIN - BLOCK)
     # ------------------------------
 
-    def immediate_tactics(self, b, player, legal):
-
-        def apply_move(board, col, p):
-            newb = board.copy()
-            for r in range(5, -1, -1):
-                if newb[r, col] == 0:
-                    newb[r, col] = p
-                    break
-            return newb
-
-        def winner(bb):
-            # Horizontal
-            for r in range(6):
-                for c in range(4):
-                    line = bb[r, c:c+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-
-            # Vertical
-            for c in range(7):
-                col = bb[:, c]
-                for r in range(3):
-                    line = col[r:r+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-
-            # Diagonal derecha
-            for r in range(3):
-                for c in range(4):
-                    diag = np.array([bb[r+i, c+i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            # Diagonal izquierda
-            for r in range(3):
-                for c in range(3,7):
-                    diag = np.array([bb[r+i, c-i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            return 0
+    def immediate_tactics(self, red, yellow, heights, player, legal):
+
+        mine, opp = (red, yellow) if player == -1 else (yellow, red)
 
         # 1. WIN MOVE
         for m in legal:
-            if winner(apply_move(b, m, player)) == player:
+            idx = move_index(heights, m)
+            if last_move_wins(mine | (1 << idx), idx):
                 return m
 
         # 2. BLOCK OPPONENT WIN
-        opp = -player
         for m in legal:
-            if winner(apply_move(b, m, opp)) == opp:
+            idx = move_index(heights, m)
+            if last_move_wins(opp | (1 << idx), idx):
                 return m
 
         return None
@@ -122,133 +81,53 @@ class ALjuriRuiz(Policy):
 
     def act(self, board: np.ndarray) -> int:
 
-        reds = np.sum(board == -1)
-        yellows = np.sum(board == 1)
-        player = -1 if reds == yellows else 1
+        deadline = None
+        if self.time_out is not None:
+            deadline = time.perf_counter() + self.time_out * (1 - self.TIME_MARGIN)
+
+        red, yellow, heights = board_to_bitboards(board)
+        player = -1 if sum(heights) % 2 == 0 else 1
+
+        legal = legal_moves(heights)
+        state, mirrored = canonical_key(position_key(red, yellow))
 
-        legal = [c for c in range(7) if board[0, c] == 0]
-        state = self.encode(board)
+        def remember(action):
+            # El episodio guarda la acción en la orientación canónica
+            self.episode.append((state, COLS - 1 - action if mirrored else action))
+            return action
 
         # 1. Immediate tactics (win/block)
-        tact = self.immediate_tactics(board, player, legal)
+        tact = self.immediate_tactics(red, yellow, heights, player, legal)
         if tact is not None:
-            self.episode.append((state, tact))
-            return tact
+            return remember(tact)
 
         # 2. Q-table if known
-        known = [(self.Q[(state, a)], a) for a in legal if (state, a) in self.Q]
+        entry = self.table.get(state)
+        known = []
+        if entry is not None:
+            q, n = entry
+            if mirrored:
+                q, n = q[::-1], n[::-1]
+            known = [(q[a], a) for a in legal if n[a] > 0]
         if known:
             _, action = max(known)
-            self.episode.append((state, action))
-            return action
+            return remember(action)
 
         # 3. MCTS fallback (new unknown states)
-        action = self.mcts(board)
-        self.episode.append((state, action))
-        return action
+        return remember(self.mcts(red, yellow, heights, player, legal, deadline))
 
     # ------------------------------
-    # MCTS EXACTO (VERSIÓN BUENA)
+    # MCTS (árbol completo con transposiciones)
     # ------------------------------
 
-    def mcts(self, board):
-        ITER = 10
-        C = 1.41
-
-        def infer_player(b):
-            reds = np.sum(b == -1)
-            yell = np.sum(b == 1)
-            return -1 if reds == yell else 1
-
-        def get_legal(b):
-            return [c for c in range(7) if b[0, c] == 0]
-
-        def apply_move(b, col, player):
-            newb = b.copy()
-            for r in range(5, -1, -1):
-                if newb[r, col] == 0:
-                    newb[r, col] = player
-                    break
-            return newb
-
-        def winner(b):
-            # Horizontal
-            for r in range(6):
-                for c in range(4):
-                    line = b[r, c:c+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-
-            # Vertical
-            for c in range(7):
-                col = b[:, c]
-                for r in range(3):
-                    line = col[r:r+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-
-            # Diag derecha
-            for r in range(3):
-                for c in range(4):
-                    diag = np.array([b[r+i, c+i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            # Diag izquierda
-            for r in range(3):
-                for c in range(3,7):
-                    diag = np.array([b[r+i, c-i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            if np.all(b[0] != 0):
-                return 2
-            return 0
-
-        def rollout(b, player):
-            current = player
-            bb = b.copy()
-            while True:
-                w = winner(bb)
-                if w != 0:
-                    return w
-                legal = get_legal(bb)
-                mv = legal[np.random.randint(len(legal))]
-                bb = apply_move(bb, mv, current)
-                current = -current
-
-        def select_ucb(moves, wins, plays):
-            total = sum(plays[m] for m in moves) + 1e-9
-            best = moves[0]
-            best_score = -1
-            for m in moves:
-                if plays[m] == 0:
-                    return m
-                exploit = wins[m] / plays[m]
-                explore = C * np.sqrt(np.log(total) / plays[m])
-                score = exploit + explore
-                if score > best_score:
-                    best_score = score
-                    best = m
-            return best
-
-        player = infer_player(board)
-        legal = get_legal(board)
-
-        wins = {m: 0 for m in legal}
-        plays = {m: 0 for m in legal}
-
-        for _ in range(ITER):
-            m = select_ucb(legal, wins, plays)
-            b2 = apply_move(board, m, player)
-            result = rollout(b2, -player)
-            plays[m] += 1
-            if result == player:
-                wins[m] += 1
-            elif result == 2:
-                wins[m] += 0.5
-
-        return max(legal, key=lambda m: plays[m])
+    def mcts(self, red, yellow, heights, player, legal, deadline=None):
+        iterations = self.ITER if deadline is None else None
+
+        start = time.perf_counter()
+        stats = self.tree.search(red, yellow, heights, player, iterations, deadline)
+        self.search_log.append((self.tree.last_iterations, time.perf_counter() - start))
+
+        return max(legal, key=lambda m: stats[m][1])
 
     # ------------------------------
     # FVMC LEARNING
@@ -261,13 +140,7 @@ class ALjuriRuiz(Policy):
         for (s, a) in reversed(self.episode):
             if (s, a) not in visited:
                 visited.add((s, a))
-
-                if (s, a) not in self.N:
-                    self.N[(s, a)] = 0
-                    self.Q[(s, a)] = 0.0
-
-                self.N[(s, a)] += 1
-                self.Q[(s, a)] += (G - self.Q[(s, a)]) / self.N[(s, a)]
+                self.table.add_return(s, a, G)
 
             G *= self.gamma
 
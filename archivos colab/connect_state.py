@@ -13,15 +13,89 @@ class ConnectState(EnvironmentState):
     ROWS = 6
     COLS = 7
 
+    # Bitboard layout: each column takes ROWS + 1 bits (one sentinel bit on
+    # top), bit index = col * (ROWS + 1) + row, with row 0 at the bottom.
+    H1 = ROWS + 1
+    CELL_SHIFTS = (
+        np.arange(COLS, dtype=np.uint64) * np.uint64(H1)
+        + np.arange(ROWS - 1, -1, -1, dtype=np.uint64)[:, None]
+    )
+    CELL_BITS = np.uint64(1) << CELL_SHIFTS
+    BOTTOM = int(np.bitwise_or.reduce(CELL_BITS[ROWS - 1]))
+
     def __init__(self, board: np.ndarray | None = None, player: int = -1):
         if board is None:
-            self.board = np.zeros((self.ROWS, self.COLS), dtype=int)
+            self.red = 0
+            self.yellow = 0
+            self.heights = [0] * self.COLS
         else:
-            self.board = board.copy()
+            self.red = int(np.bitwise_or.reduce(self.CELL_BITS[board == -1]))
+            self.yellow = int(np.bitwise_or.reduce(self.CELL_BITS[board == 1]))
+            self.heights = [int(h) for h in np.count_nonzero(board, axis=0)]
+        # Perfect 64-bit position key: red + (red | yellow) + bottom row
+        self.key = self.red + (self.red | self.yellow) + self.BOTTOM
+        self._board = None
+        self._winner = None
         self.player = player  # -1 = Red, 1 = Yellow type: ignore
 
+    @classmethod
+    def from_bitboards(
+        cls,
+        red: int,
+        yellow: int,
+        heights: list[int],
+        player: int,
+        winner: int | None = None,
+        key: int | None = None,
+    ) -> "ConnectState":
+        state = cls.__new__(cls)
+        state.red = red
+        state.yellow = yellow
+        state.heights = heights
+        state.key = red + (red | yellow) + cls.BOTTOM if key is None else key
+        state._board = None
+        state._winner = winner
+        state.player = player
+        return state
+
+    @property
+    def board(self) -> np.ndarray:
+        # Numpy view of the bitboards, built lazily for Policy.act(board)
+        if self._board is None:
+            red = (np.uint64(self.red) >> self.CELL_SHIFTS) & np.uint64(1)
+            yellow = (np.uint64(self.yellow) >> self.CELL_SHIFTS) & np.uint64(1)
+            self._board = yellow.astype(int) - red.astype(int)
+        return self._board
+
+    @staticmethod
+    def has_four(mask: int) -> bool:
+        for shift in (1, ConnectState.H1, ConnectState.H1 - 1, ConnectState.H1 + 1):
+            m = mask & (mask >> shift)
+            if m & (m >> (2 * shift)):
+                return True
+        return False
+
+    @staticmethod
+    def last_move_wins(mask: int, col: int, row: int) -> bool:
+        # Only the lines through (col, row) can be completed by that piece
+        h1 = ConnectState.H1
+        bit = 1 << (col * h1 + row)
+        for shift in (1, h1, h1 - 1, h1 + 1):
+            count = 1
+            probe = bit >> shift
+            while mask & probe:
+                count += 1
+                probe >>= shift
+            probe = bit << shift
+            while mask & probe:
+                count += 1
+                probe <<= shift
+            if count >= 4:
+                return True
+        return False
+
     def is_final(self) -> bool:
-        return self.get_winner() != 0 or not any(self.board[0] == 0)
+        return self.get_winner() != 0 or all(h == self.ROWS for h in self.heights)
 
     def is_applicable(self, event: Any) -> bool:
         return (
@@ -32,54 +106,20 @@ class ConnectState(EnvironmentState):
         )
 
     def get_winner(self) -> int:
-        # Check all 4 directions
-        for r in range(self.ROWS):
-            for c in range(self.COLS):
-                player = self.board[r, c]
-                if player == 0:
-                    continue
-
-                # Right
-                if c + 3 < self.COLS and all(
-                    self.board[r, c + i] == player for i in range(4)
-                ):
-                    return player
-                # Down
-                if r + 3 < self.ROWS and all(
-                    self.board[r + i, c] == player for i in range(4)
-                ):
-                    return player
-                # Diagonal right-down
-                if (
-                    r + 3 < self.ROWS
-                    and c + 3 < self.COLS
-                    and all(self.board[r + i, c + i] == player for i in range(4))
-                ):
-                    return player
-                # Diagonal left-down
-                if (
-                    r + 3 < self.ROWS
-                    and c - 3 >= 0
-                    and all(self.board[r + i, c - i] == player for i in range(4))
-                ):
-                    return player
-
-        return 0
+        if self._winner is None:
+            if self.has_four(self.red):
+                self._winner = -1
+            elif self.has_four(self.yellow):
+                self._winner = 1
+            else:
+                self._winner = 0
+        return self._winner
 
     def is_col_free(self, col: int) -> bool:
-        return self.board[0, col] == 0
+        return self.heights[col] < self.ROWS
 
     def get_heights(self) -> list[int]:
-        heights = []
-        for c in range(self.COLS):
-            col = self.board[:, c]
-            for r in range(self.ROWS):
-                if col[r] != 0:
-                    heights.append(self.ROWS - r)
-                    break
-            else:
-                heights.append(0)
-        return heights
+        return list(self.heights)
 
     def get_free_cols(self) -> list[int]:
         return [c for c in range(self.COLS) if self.is_col_free(c)]
@@ -88,13 +128,29 @@ class ConnectState(EnvironmentState):
         if not self.is_applicable(col):
             raise ValueError(f"Move not allowed in column {col}.")
 
-        new_board = self.board.copy()
-        for r in reversed(range(self.ROWS)):
-            if new_board[r, col] == 0:
-                new_board[r, col] = self.player
-                break
+        row = self.heights[col]
+        bit = 1 << (col * self.H1 + row)
+        heights = list(self.heights)
+        heights[col] += 1
+
+        # A legal move starts from a non-final state, so only the piece just
+        # dropped can decide the winner of the new state.
+        # The key is updated incrementally: the mask part always gains the
+        # new bit, the red part only when red moves.
+        red, yellow = self.red, self.yellow
+        if self.player == -1:
+            red |= bit
+            mover = red
+            key = self.key + 2 * bit
+        else:
+            yellow |= bit
+            mover = yellow
+            key = self.key + bit
+        winner = self.player if self.last_move_wins(mover, col, row) else 0
 
-        return ConnectState(new_board, -self.player)
+        return ConnectState.from_bitboards(
+            red, yellow, heights, -self.player, winner, key
+        )
 
     def show(self, size: int = 1500, ax: plt.Axes | None = None) -> None:
         if ax is None:
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from connect4.connect_state import ConnectState
+
+from policy import (
+    ALjuriRuiz, PackedQTable, SearchTree, batch_rollouts, board_to_bitboards,
+    bitboards_to_board, last_move_wins, legal_moves, move_index,
+)
+
+# Benchmarks reproducibles (todo con semilla) de los caminos calientes:
+# entorno, rollouts, act(), carga de la Q-table y self-play. Se guardan en
+# JSON y con --compare se marcan las regresiones frente a una base.
+# Convención de nombres de métricas: *_per_second más es mejor; *_ns,
+# *_ms, *_seconds y *_bytes menos es mejor; el resto es informativo.
+
+
+def corpus(count, seed, min_stones=4, max_stones=30):
+    """Posiciones fijas (sin ganador ni tablero lleno) para medir act()."""
+    rng = np.random.default_rng(seed)
+    positions = []
+    while len(positions) < count:
+        red = yellow = 0
+        heights = [0] * 7
+        player = -1
+        target = int(rng.integers(min_stones, max_stones + 1))
+        for _ in range(target):
+            m = int(rng.choice(legal_moves(heights)))
+            idx = move_index(heights, m)
+            if player == -1:
+                red |= 1 << idx
+                mask = red
+            else:
+                yellow |= 1 << idx
+                mask = yellow
+            heights[m] += 1
+            player = -player
+            if last_move_wins(mask, idx):
+                break
+        else:
+            positions.append(bitboards_to_board(red, yellow))
+    return positions
+
+
+def bench_env(seed, games):
+    """ns por transition() y por get_winner() jugando partidas al azar."""
+    rng = np.random.default_rng(seed)
+    transitions = winners = 0
+    t_transition = t_winner = 0.0
+    for _ in range(games):
+        state = ConnectState()
+        while True:
+            start = time.perf_counter_ns()
+            winner = state.get_winner()
+            t_winner += time.perf_counter_ns() - start
+            winners += 1
+            if winner != 0 or not state.get_free_cols():
+                break
+            col = int(rng.choice(state.get_free_cols()))
+            start = time.perf_counter_ns()
+            state = state.transition(col)
+            t_transition += time.perf_counter_ns() - start
+            transitions += 1
+    return {
+        "transition_ns": t_transition / transitions,
+        "get_winner_ns": t_winner / winners,
+        "transitions": transitions,
+    }
+
+
+def bench_rollouts(seed, positions, iterations):
+    """Rollouts por segundo: en lote directo y dentro del MCTS."""
+    np.random.seed(seed)
+    rng = np.random.default_rng(seed)
+    batch = 256
+    start = time.perf_counter()
+    for board in positions:
+        red, yellow, heights = board_to_bitboards(board)
+        player = -1 if sum(heights) % 2 == 0 else 1
+        batch_rollouts(red, yellow, heights, player, batch, rng)
+    batch_seconds = time.perf_counter() - start
+
+    tree = SearchTree()
+    start = time.perf_counter()
+    done = 0
+    for board in positions:
+        red, yellow, heights = board_to_bitboards(board)
+        player = -1 if sum(heights) % 2 == 0 else 1
+        tree.clear()
+        tree.search(red, yellow, heights, player, iterations)
+        done += tree.last_iterations
+    mcts_seconds = time.perf_counter() - start
+    return {
+        "batch_rollouts_per_second": len(positions) * batch / batch_seconds,
+        "mcts_rollouts_per_second": done * tree.batch / mcts_seconds,
+        "mcts_iterations_per_second": done / mcts_seconds,
+    }
+
+
+def bench_act(seed, positions, engine):
+    """Latencia de act() (percentiles) sobre el corpus, sin time_out."""
+    np.random.seed(seed)
+    # Tablebase vacía y temporal: que los finales se resuelvan siempre igual
+    with tempfile.TemporaryDirectory() as tmp:
+        policy = ALjuriRuiz(engine=engine,
+                            tablebase_filename=os.path.join(tmp, "tablebase.bin"))
+        policy.mount()
+        times = []
+        for board in positions:
+            start = time.perf_counter()
+            policy.act(board)
+            times.append((time.perf_counter() - start) * 1e3)
+        policy.close()
+    times = np.array(times)
+    return {
+        "act_p50_ms": float(np.percentile(times, 50)),
+        "act_p90_ms": float(np.percentile(times, 90)),
+        "act_p99_ms": float(np.percentile(times, 99)),
+        "act_max_ms": float(times.max()),
+    }
+
+
+def bench_table(path, repeats):
+    """Tiempo de open() (mmap) y load(), y memoria de Python de cada uno."""
+    results = {}
+    for name, loader in (("open", PackedQTable.open), ("load", PackedQTable.load)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            loader(path)
+        seconds = (time.perf_counter() - start) / repeats
+        tracemalloc.start()
+        table = loader(path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"{name}_seconds"] = seconds
+        results[f"{name}_peak_bytes"] = peak
+    results["states"] = len(table)
+    results["file_bytes"] = os.path.getsize(path)
+    return results
+
+
+def bench_selfplay(seed, games):
+    """Partidas por segundo de play_game() entre dos agentes entrenables."""
+    from aljuri_policy_trainable import ALjuriRuiz as Trainable
+    from training_env import play_game
+
+    np.random.seed(seed)
+    a, b = Trainable(), Trainable()
+    start = time.perf_counter()
+    for _ in range(games):
+        play_game(a, b)
+    seconds = time.perf_counter() - start
+    return {"selfplay_games_per_second": games / seconds}
+
+
+def bench_vec_selfplay(seed, games):
+    """Partidas por segundo de VecConnectState con políticas en lote."""
+    from vec_env import VecConnectState, play_batch, random_actions, tactic_actions
+
+    results = {}
+    for name, policy in (("random", random_actions), ("tactics", tactic_actions)):
+        rng = np.random.default_rng(seed)
+        start = time.perf_counter()
+        play_batch(VecConnectState(1024), policy, policy, games, rng)
+        results[f"vec_{name}_games_per_second"] = games / (time.perf_counter() - start)
+    return results
+
+
+def run(args):
+    quick = args.quick
+    positions = corpus(20 if quick else 100, args.seed)
+    benches = {
+        "env": lambda: bench_env(args.seed, 50 if quick else 500),
+        "rollouts": lambda: bench_rollouts(args.seed, positions[:10], 20 if quick else 50),
+        "act_mcts": lambda: bench_act(args.seed, positions, "mcts"),
+        "act_alphabeta": lambda: bench_act(args.seed, positions, "alphabeta"),
+        "table": lambda: bench_table(args.table, 3 if quick else 20),
+        "selfplay": lambda: bench_selfplay(args.seed, 5 if quick else 30),
+        "vec_selfplay": lambda: bench_vec_selfplay(args.seed, 5000 if quick else 50000),
+    }
+    results = {}
+    for name, bench in benches.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"[INFO] {name} ...")
+        results[name] = bench()
+    return {
+        "meta": {
+            "seed": args.seed,
+            "quick": quick,
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Métricas que empeoran más de tolerance (fracción) frente a baseline."""
+    regressions = []
+    for bench, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            base = baseline["results"].get(bench, {}).get(metric)
+            if base is None or base == 0:
+                continue
+            if metric.endswith("_per_second"):
+                change = (base - value) / base
+            elif metric.endswith(("_ns", "_ms", "_seconds", "_bytes")):
+                change = (value - base) / base
+            else:
+                continue
+            status = "REGRESIÓN" if change > tolerance else "ok"
+            print(f"{status:>9}  {bench}.{metric}: {base:.4g} -> {value:.4g} ({-change:+.1%})")
+            if change > tolerance:
+                regressions.append(f"{bench}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de entorno, búsqueda, Q-table y self-play")
+    parser.add_argument("--output", default="benchmark.json", help="JSON de resultados")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="tamaños pequeños")
+    parser.add_argument("--only", nargs="*", default=None,
+                        help="env rollouts act_mcts act_alphabeta table selfplay vec_selfplay")
+    parser.add_argument("--table", default="Q_table_NuevoCleaned.bin")
+    parser.add_argument("--compare", default=None, help="JSON base para buscar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.20,
+                        help="empeoramiento tolerado (0.20 = 20%%; los tiempos cortos son ruidosos)")
+    args = parser.parse_args()
+
+    current = run(args)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"[INFO] Resultados guardados en {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"[WARNING] {len(regressions)} regresiones: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+
+from policy import PackedQTable
+
+# ---------------------------------------
+# CHECKPOINTS INCREMENTALES
+# ---------------------------------------
+# En el directorio del checkpoint:
+#   base_XXXXXX.bin   tabla completa (formato .bin de la Q-table)
+#   delta_XXXXXX.bin  solo las filas que cambiaron desde el checkpoint
+#                     anterior, con sus valores completos de Q/N
+#   manifest.json     base y deltas vigentes (en orden) y el cursor del
+#                     entrenamiento (par / episodio o ronda)
+# Todo se escribe en un .tmp y se renombra (os.replace es atómico), y el
+# manifest va al final: un corte a mitad deja el checkpoint anterior
+# intacto. Cada compact_every deltas se escribe una base nueva y se
+# borran los deltas viejos. QTable, BoundedQTable y SharedQTable llevan
+# la cuenta de las filas cambiadas (dirty_packed / mark_clean); una tabla
+# sin ella siempre se guarda completa, y también una BoundedQTable que
+# desalojó estados: un delta no puede borrar filas, así que restore() los
+# traería de vuelta.
+
+MANIFEST = "manifest.json"
+
+
+def _atomic_write(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _save_packed(path, packed):
+    packed.save(path + ".tmp")
+    with open(path + ".tmp", "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class Checkpointer:
+
+    def __init__(self, table, directory, every_games=1000, every_seconds=600,
+                 compact_every=10):
+        self.table = table
+        self.directory = directory
+        self.every_games = every_games
+        self.every_seconds = every_seconds
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+
+        self.manifest = self._read_manifest() or {"seq": 0, "base": None, "deltas": []}
+        # Sin restore() la tabla no parte de la base del manifest (una
+        # corrida nueva en un directorio usado): el primer save() es completo
+        self.restored = False
+        self.games = 0
+        self.last = time.perf_counter()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def restore(self):
+        """Carga base + deltas en la tabla; devuelve el cursor o None."""
+        self.restored = True
+        if self.manifest["base"] is None:
+            return None
+        self.table.update_from_packed(PackedQTable.load(self._path(self.manifest["base"])))
+        for name in self.manifest["deltas"]:
+            self.table.update_rows(PackedQTable.load(self._path(name)))
+        if hasattr(self.table, "mark_clean"):
+            self.table.mark_clean()   # lo cargado ya está en disco
+        print(f"[INFO] Checkpoint restaurado: {len(self.table)} estados, "
+              f"cursor {self.manifest['cursor']}")
+        return self.manifest["cursor"]
+
+    def due(self, games=1):
+        """Cuenta partidas y dice si toca guardar (por partidas o por tiempo)."""
+        self.games += games
+        return (self.games >= self.every_games
+                or time.perf_counter() - self.last >= self.every_seconds)
+
+    def save(self, cursor):
+        seq = self.manifest["seq"] + 1
+        incremental = hasattr(self.table, "mark_clean")
+        old = [self.manifest["base"]] + self.manifest["deltas"]
+
+        if (not incremental or not self.restored or self.manifest["base"] is None
+                or getattr(self.table, "evicted", False)
+                or len(self.manifest["deltas"]) >= self.compact_every):
+            # Compactación: base nueva con la tabla completa
+            name = f"base_{seq:06d}.bin"
+            _save_packed(self._path(name), self.table.to_packed())
+            manifest = {"seq": seq, "base": name, "deltas": []}
+        else:
+            name = f"delta_{seq:06d}.bin"
+            _save_packed(self._path(name), self.table.dirty_packed())
+            manifest = dict(self.manifest, seq=seq,
+                            deltas=self.manifest["deltas"] + [name])
+            old = []
+
+        manifest["cursor"] = cursor
+        _atomic_write(self._path(MANIFEST), lambda f: f.write(json.dumps(manifest).encode()))
+        self.manifest = manifest
+        self.restored = True   # la base escrita ya es la de esta tabla
+        if incremental:
+            self.table.mark_clean()
+
+        # Los archivos que dejó de usar el manifest ya se pueden borrar
+        for stale in old:
+            if stale is not None:
+                os.remove(self._path(stale))
+
+        self.games = 0
+        self.last = time.perf_counter()
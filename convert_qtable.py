@@ -0,0 +1,25 @@
+import argparse
+import os
+
+from policy import PackedQTable
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convierte una Q-table (JSON sha1|acción o .bin anterior) al formato .bin actual"
+    )
+    parser.add_argument("input", help="Q-table de entrada (.json o .bin)")
+    parser.add_argument("output", help="archivo .bin de salida")
+    args = parser.parse_args()
+
+    table = PackedQTable.load(args.input)
+    table.save(args.output)
+
+    size_in = os.path.getsize(args.input)
+    size_out = os.path.getsize(args.output)
+    print("Estados:", len(table), "- entradas:", table.entries())
+    print(f"Tamaño: {size_in} B -> {size_out} B ({size_in / size_out:.1f}x más pequeño)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import struct
+
+import numpy as np
+
+# ---------------------------------------
+# LOG BINARIO DE PARTIDAS (append-only)
+# ---------------------------------------
+# Archivo .log: bloques añadidos al final, cada uno con
+#   cabecera  "<II": número de partidas, bytes de las partidas
+#   partidas  "<BbHH": jugadas, ganador (-1, 1, 0 = empate), id del agente
+#             rojo, id del agente amarillo; después las columnas jugadas,
+#             dos por byte (4 bits cada una, la primera en los bits bajos)
+# Archivo .log.idx: un registro "<QII" por bloque (posición del bloque en
+# el .log, número de partidas, índice de su primera partida), para saltar
+# directamente a cualquier bloque.
+
+CHUNK_HEADER = struct.Struct("<II")
+GAME_HEADER = struct.Struct("<BbHH")
+INDEX_RECORD = struct.Struct("<QII")
+
+
+def pack_moves(moves):
+    padded = np.zeros(len(moves) + len(moves) % 2, dtype=np.uint8)
+    padded[:len(moves)] = moves
+    return (padded[0::2] | (padded[1::2] << 4)).tobytes()
+
+
+def unpack_moves(data, count):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    moves = np.empty(2 * len(packed), dtype=np.uint8)
+    moves[0::2] = packed & 0x0F
+    moves[1::2] = packed >> 4
+    return moves[:count].tolist()
+
+
+class EpisodeLogWriter:
+    """
+    Acumula partidas y las escribe por bloques de chunk_size. append()
+    recibe (jugadas, ganador, id rojo, id amarillo), igual que una lista,
+    así play_game() puede escribir aquí o en una lista de un worker.
+    """
+
+    def __init__(self, path, chunk_size=256):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.chunk_size = chunk_size
+        self.pending = []
+        # Partidas ya escritas (para el índice de primera partida)
+        self.games = sum(games for _, games, _ in read_index(self.index_path))
+
+    def append(self, game):
+        self.pending.append(game)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, games):
+        for game in games:
+            self.append(game)
+
+    def flush(self):
+        if not self.pending:
+            return
+        body = b"".join(
+            GAME_HEADER.pack(len(moves), winner, agent_a, agent_b) + pack_moves(moves)
+            for moves, winner, agent_a, agent_b in self.pending
+        )
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(CHUNK_HEADER.pack(len(self.pending), len(body)))
+            f.write(body)
+        # El índice se escribe después: un bloque sin índice se ignora
+        with open(self.index_path, "ab") as f:
+            f.write(INDEX_RECORD.pack(offset, len(self.pending), self.games))
+        self.games += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_index(index_path):
+    """[(posición, partidas, primera partida)] de cada bloque escrito."""
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, "rb") as f:
+        data = f.read()
+    usable = len(data) - len(data) % INDEX_RECORD.size
+    return list(INDEX_RECORD.iter_unpack(data[:usable]))
+
+
+class EpisodeLogReader:
+
+    def __init__(self, path):
+        self.path = path
+        self.index = read_index(path + ".idx")
+
+    def __len__(self):
+        return sum(games for _, games, _ in self.index)
+
+    def chunks(self):
+        return len(self.index)
+
+    def read_chunk(self, i):
+        """Partidas del bloque i: [(jugadas, ganador, id rojo, id amarillo)]."""
+        offset, _, _ = self.index[i]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            count, size = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            body = f.read(size)
+        games = []
+        pos = 0
+        for _ in range(count):
+            n_moves, winner, agent_a, agent_b = GAME_HEADER.unpack_from(body, pos)
+            pos += GAME_HEADER.size
+            n_bytes = (n_moves + 1) // 2
+            games.append((unpack_moves(body[pos:pos + n_bytes], n_moves),
+                          winner, agent_a, agent_b))
+            pos += n_bytes
+        return games
+
+    def __iter__(self):
+        for i in range(len(self.index)):
+            yield from self.read_chunk(i)
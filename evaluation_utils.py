@@ -1,29 +1,42 @@
+import os
+import sys
 
 from training_env import train_agents
 from aljuri_policy_trainable import ALjuriRuiz
+from checkpoint import Checkpointer
+from episode_log import EpisodeLogWriter
 from policyHello import HelloPolicy
+from shared_qtable import SharedQTable
 
-# Crear 8 agentes inteligentes
-agents_good = [ALjuriRuiz() for _ in range(8)]
-
-# Crear 1 agentes aleatorios
-agents_random = [HelloPolicy() for _ in range(1)]
-
-agents = agents_good + agents_random
-
-
-# Para que todos compartan la misma memoria:
-shared_Q = agents[0].Q
-shared_N = agents[0].N
-for a in agents:
-    a.Q = shared_Q
-    a.N = shared_N
 
 if __name__ == "__main__":
     import multiprocessing as mp
-    mp.freeze_support()   
-    train_agents(agents, episodes_per_pair=100)
-
-
-# Guardar modelo final
-agents[0].save("Q_table_Nuevo.json")
+    mp.freeze_support()
+
+    # Crear 8 agentes inteligentes
+    agents_good = [ALjuriRuiz() for _ in range(8)]
+
+    # Crear 1 agentes aleatorios
+    agents_random = [HelloPolicy() for _ in range(1)]
+
+    agents = agents_good + agents_random
+
+    # Para que todos compartan la misma memoria (también entre procesos):
+    shared_table = SharedQTable()
+    for a in agents_good:
+        a.table = shared_table
+
+    # Un worker por núcleo; los pares se juegan en paralelo y cada learn()
+    # escribe directamente en shared_table. Las partidas quedan en
+    # episodes.log para poder reentrenar o auditar sin volver a jugarlas.
+    # Checkpoint cada 1000 partidas o 10 minutos; tras un corte se sigue
+    # con: python evaluation_utils.py --resume
+    checkpoint = Checkpointer(shared_table, "checkpoints")
+    with EpisodeLogWriter("episodes.log") as log:
+        train_agents(agents, episodes_per_pair=100,
+                     workers=os.cpu_count() or 1, log=log,
+                     checkpoint=checkpoint, resume="--resume" in sys.argv)
+
+    # Guardar modelo final
+    agents[0].save("Q_table_Nuevo.bin")
+    shared_table.close()
@@ -0,0 +1,51 @@
+import argparse
+
+import numpy as np
+
+from policy import COLS, PackedQTable, mirror_keys
+
+
+def fold_mirrors(table):
+    """
+    Junta cada estado con su reflejo bajo la clave canónica (la menor).
+    Las acciones del estado reflejado se invierten (a -> 6 - a) y las
+    entradas repetidas se combinan con la media ponderada por N.
+    """
+    q, n = table.to_dense()
+    keys = table.keys.astype(np.uint64)
+    mirrored = mirror_keys(keys)
+    flip = mirrored < keys
+    canonical = np.where(flip, mirrored, keys)
+    q[flip] = q[flip, ::-1]
+    n[flip] = n[flip, ::-1]
+
+    states, rows = np.unique(canonical, return_inverse=True)
+    n_sum = np.zeros((len(states), COLS))
+    qn_sum = np.zeros((len(states), COLS))
+    np.add.at(n_sum, rows, n)
+    np.add.at(qn_sum, rows, q.astype(np.float64) * n)
+    q_mean = np.divide(qn_sum, n_sum, out=np.zeros_like(qn_sum), where=n_sum > 0)
+    return PackedQTable.from_dense(states.astype("<u8"), q_mean, n_sum)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pliega la Q-table por simetría izquierda-derecha"
+    )
+    parser.add_argument("input", help="Q-table .bin con claves de posición")
+    parser.add_argument("output", help="Q-table .bin canónica de salida")
+    args = parser.parse_args()
+
+    table = PackedQTable.load(args.input)
+    if table.has_sha1_keys():
+        raise SystemExit(f"{args.input} usa claves SHA1: migrarla antes con migrate_qtable_keys.py")
+
+    folded = fold_mirrors(table)
+    folded.save(args.output)
+
+    print(f"Estados: {len(table)} -> {len(folded)}")
+    print(f"Entradas (estado, acción): {table.entries()} -> {folded.entries()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from policy import (
+    COLS, QTABLE_ENTRIES, QTABLE_HEADER, QTABLE_MAGIC, QTABLE_VERSION, PackedQTable,
+)
+
+# Junta y poda Q-tables .bin sin cargarlas enteras: las entradas se abren
+# como memory map y, como las claves están ordenadas, se recorren a la vez
+# por trozos (merge de k vías). Cada trozo se junta con medias ponderadas
+# por N, se poda y se escribe; la salida también sale por trozos, una
+# columna por archivo temporal, y al final se concatenan tras la cabecera.
+
+
+def _slice(table, lo, hi):
+    """Estados lo:hi de una PackedQTable como (claves, Q, N) densos."""
+    first = int(table.start[lo]) if lo < len(table) else table.entries()
+    last = int(table.start[hi]) if hi < len(table) else table.entries()
+    part = PackedQTable(
+        table.keys[lo:hi], table.mask[lo:hi], table.start[lo:hi] - first,
+        table.q[first:last], table.n[first:last],
+    )
+    q, n = part.to_dense()
+    return np.asarray(part.keys), q.astype(np.float64), n.astype(np.int64)
+
+
+def merge_chunk(parts):
+    """Une los (claves, Q, N) de varias tablas: N = suma, Q = media ponderada por N."""
+    keys = np.concatenate([k for k, _, _ in parts])
+    q = np.concatenate([q for _, q, _ in parts])
+    n = np.concatenate([n for _, _, n in parts])
+    states, rows = np.unique(keys, return_inverse=True)
+    n_sum = np.zeros((len(states), COLS), dtype=np.int64)
+    qn_sum = np.zeros((len(states), COLS))
+    np.add.at(n_sum, rows, n)
+    np.add.at(qn_sum, rows, q * n)
+    q_mean = np.divide(qn_sum, n_sum, out=np.zeros_like(qn_sum), where=n_sum > 0)
+    return states, q_mean, n_sum
+
+
+def prune(q, n, min_n=1, top_k=None, max_ci=None):
+    """
+    Apaga acciones (N = 0) según las reglas y devuelve (Q, N):
+      min_n   N mínimo por acción (lo que hacía clean.py con MIN_N)
+      top_k   solo las k acciones más visitadas de cada estado
+      max_ci  semiancho máximo del intervalo del 95% de Q; con retornos en
+              [-1, 1] la varianza es como mucho (1 - Q)(1 + Q)
+    """
+    keep = n >= max(min_n, 1)
+    if top_k is not None and top_k < COLS:
+        # Rango de cada acción por N (y Q para desempatar) dentro del estado
+        order = np.lexsort((-q, -n), axis=-1)
+        rank = np.argsort(order, axis=-1)
+        keep &= rank < top_k
+    if max_ci is not None:
+        variance = np.clip((1 - q) * (1 + q), 0, None)
+        half_width = 1.96 * np.sqrt(variance / np.maximum(n, 1))
+        keep &= half_width <= max_ci
+    return np.where(keep, q, 0.0), np.where(keep, n, 0)
+
+
+class _ColumnWriter:
+    """Escribe la salida por trozos: cada columna del formato en su temporal."""
+
+    def __init__(self, directory):
+        self.files = [
+            open(os.path.join(directory, name), "wb")
+            for name in ("keys", "mask", "start", "q", "n")
+        ]
+        self.states = 0
+        self.entries = 0
+
+    def write(self, keys, q, n):
+        packed = PackedQTable.from_dense(keys, q, n)
+        columns = (packed.keys, packed.mask, packed.start + self.entries, packed.q, packed.n)
+        dtypes = (keys.dtype, np.uint8, "<u4", "<f4", "<u4")
+        for f, column, dtype in zip(self.files, columns, dtypes):
+            f.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+        self.states += len(packed)
+        self.entries += packed.entries()
+
+    def finish(self, path, width):
+        for f in self.files:
+            f.close()
+        # Por un .tmp: la salida puede ser una de las entradas (abierta como mmap)
+        with open(path + ".tmp", "wb") as out:
+            out.write(QTABLE_HEADER.pack(QTABLE_MAGIC, QTABLE_VERSION, width, self.states))
+            out.write(QTABLE_ENTRIES.pack(self.entries))
+            for f in self.files:
+                with open(f.name, "rb") as column:
+                    shutil.copyfileobj(column, out)
+        os.replace(path + ".tmp", path)
+
+
+def merge_tables(paths, output, chunk=1 << 16, min_n=1, top_k=None, max_ci=None):
+    """Junta y poda las tablas de paths en output; devuelve estadísticas."""
+    tables = [PackedQTable.open(path) for path in paths]
+    widths = {t.keys.dtype.itemsize for t in tables}
+    if len(widths) != 1:
+        raise ValueError("Las tablas tienen claves de distinto tipo (migrarlas antes)")
+    width = widths.pop()
+
+    start = time.perf_counter()
+    pos = [0] * len(tables)
+    states_in = sum(len(t) for t in tables)
+    entries_in = sum(t.entries() for t in tables)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) as tmp:
+        writer = _ColumnWriter(tmp)
+        parts = []
+        while True:
+            active = [i for i, t in enumerate(tables) if pos[i] < len(t)]
+            if not active:
+                break
+            # Hasta la menor de las últimas claves de los trozos: todo lo
+            # menor o igual ya está completo en todas las tablas
+            bound = min(tables[i].keys[min(pos[i] + chunk, len(tables[i])) - 1] for i in active)
+            parts = []
+            for i in active:
+                end = pos[i] + int(np.searchsorted(
+                    tables[i].keys[pos[i]:pos[i] + chunk], bound, side="right"
+                ))
+                parts.append(_slice(tables[i], pos[i], end))
+                pos[i] = end
+            keys, q, n = merge_chunk(parts)
+            q, n = prune(q, n, min_n, top_k, max_ci)
+            alive = n.any(axis=1)
+            writer.write(keys[alive], q[alive], n[alive])
+        # Soltar los memory maps de las entradas antes de reemplazar la
+        # salida: si es una de ellas, Windows no deja renombrar encima de
+        # un archivo mapeado
+        del tables, parts
+        writer.finish(output, width)
+
+    seconds = time.perf_counter() - start
+    bytes_in = sum(os.path.getsize(p) for p in paths)
+    return {
+        "states_in": states_in,
+        "entries_in": entries_in,
+        "states_out": writer.states,
+        "entries_out": writer.entries,
+        "seconds": seconds,
+        "mb_in_per_second": bytes_in / 1e6 / max(seconds, 1e-9),
+        "mb_out_per_second": os.path.getsize(output) / 1e6 / max(seconds, 1e-9),
+        "states_per_second": states_in / max(seconds, 1e-9),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Junta y poda Q-tables .bin por trozos, con memoria acotada (reemplaza a clean.py)"
+    )
+    parser.add_argument("inputs", nargs="+", help="Q-tables .bin de entrada")
+    parser.add_argument("-o", "--output", required=True, help="Q-table .bin de salida")
+    parser.add_argument("--min-n", type=int, default=1,
+                        help="N mínimo por acción (clean.py usaba 2)")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="acciones más visitadas que se conservan por estado")
+    parser.add_argument("--max-ci", type=float, default=None,
+                        help="semiancho máximo del intervalo del 95%% de Q")
+    parser.add_argument("--chunk", type=int, default=1 << 16,
+                        help="estados por trozo y por tabla")
+    args = parser.parse_args()
+
+    stats = merge_tables(args.inputs, args.output, args.chunk,
+                         args.min_n, args.top_k, args.max_ci)
+
+    print(f"Estados: {stats['states_in']} -> {stats['states_out']}")
+    print(f"Entradas (estado, acción): {stats['entries_in']} -> {stats['entries_out']}")
+    print(f"Tiempo: {stats['seconds']:.2f} s - {stats['states_per_second']:.0f} estados/s, "
+          f"lectura {stats['mb_in_per_second']:.1f} MB/s, "
+          f"escritura {stats['mb_out_per_second']:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import hashlib
+import time
+
+import numpy as np
+
+from fold_qtable_mirrors import fold_mirrors
+from policy import (
+    COLS, PackedQTable, bitboards_to_board, decode_sha1_state, encode_states,
+    key_after, legal_moves, move_index, position_key,
+)
+
+
+def sha1_to_position_keys(wanted, max_gap=4):
+    """
+    Recupera la posición de cada clave SHA1 (irreversible) recorriendo el
+    árbol de juego desde el tablero vacío. Solo se sigue una rama mientras
+    aparezca alguna posición de la tabla cada `max_gap` jugadas como mucho.
+    Devuelve {sha1_hex: position_key}.
+    """
+    found = {}
+    seen = set()
+    # (rojo, amarillo, alturas, clave, jugador, jugadas sin coincidencia)
+    frontier = [(0, 0, [0] * COLS, position_key(0, 0), -1, 0)]
+    while frontier:
+        next_frontier = []
+        for red, yellow, heights, key, player, gap in frontier:
+            # Mismo tablero int64 sobre el que se calculaba el SHA1
+            board = bitboards_to_board(red, yellow).astype(np.int64)
+            digest = hashlib.sha1(board.tobytes()).hexdigest()
+            if digest in wanted:
+                found[digest] = key
+                gap = 0
+            else:
+                gap += 1
+            if gap > max_gap:
+                continue
+            for col in legal_moves(heights):
+                idx = move_index(heights, col)
+                child_key = key_after(key, idx, player)
+                if child_key in seen:
+                    continue
+                seen.add(child_key)
+                child_heights = list(heights)
+                child_heights[col] += 1
+                if player == -1:
+                    child = (red | 1 << idx, yellow)
+                else:
+                    child = (red, yellow | 1 << idx)
+                next_frontier.append(
+                    (*child, child_heights, child_key, -player, gap)
+                )
+        frontier = next_frontier
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migra una Q-table con claves SHA1 a claves de posición de 64 bits"
+    )
+    parser.add_argument("input", help="Q-table SHA1 (.json o .bin)")
+    parser.add_argument("output", help="Q-table .bin de salida")
+    parser.add_argument("--max-gap", type=int, default=4,
+                        help="jugadas seguidas sin coincidencia antes de podar una rama")
+    args = parser.parse_args()
+
+    table = PackedQTable.load(args.input)
+    if not table.has_sha1_keys():
+        raise SystemExit(f"{args.input} ya usa claves de posición")
+
+    start = time.perf_counter()
+    wanted = {decode_sha1_state(k): i for i, k in enumerate(table.keys)}
+    found = sha1_to_position_keys(wanted, args.max_gap)
+
+    rows = np.array([wanted[s] for s in found], dtype=np.int64)
+    q, n = table.to_dense()
+    migrated = PackedQTable.from_dense(
+        encode_states(list(found.values())), q[rows], n[rows]
+    )
+    lost = len(table) - len(migrated)
+    # Las posiciones se guardan en su orientación canónica
+    migrated = fold_mirrors(migrated)
+    migrated.save(args.output)
+
+    visits = int(n.sum())
+    kept_visits = int(n[rows].sum()) if len(rows) else 0
+    print(f"Estados migrados: {len(table) - lost} de {len(table)} ({lost} sin encontrar)")
+    print(f"Estados canónicos (plegando reflejos): {len(migrated)}")
+    print(f"Visitas conservadas: {kept_visits} de {visits}")
+    print(f"Tiempo: {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
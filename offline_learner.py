@@ -0,0 +1,125 @@
+import argparse
+import time
+
+import numpy as np
+
+from episode_log import EpisodeLogReader
+from policy import COLS, H1, ROWS, canonical_keys_batch
+from qtable import QTable
+
+
+def replay_batch(games, gamma, learners=None):
+    """
+    Estados y retornos de un lote de partidas del log, sin bucle por jugada
+    en Python: todas las partidas avanzan a la vez, una jugada por paso.
+    Devuelve (claves canónicas, acciones canónicas, retornos G) de las
+    jugadas de los agentes de learners (None = todos), igual que learn():
+    la última jugada de cada agente recibe la recompensa y las anteriores
+    gamma**k veces la recompensa.
+    """
+    count = len(games)
+    plies = ROWS * COLS
+    moves = np.zeros((count, plies), dtype=np.int64)
+    length = np.zeros(count, dtype=np.int64)
+    winner = np.zeros(count, dtype=np.int64)
+    agents = np.zeros((count, 2), dtype=np.int64)
+    for g, (game_moves, game_winner, agent_a, agent_b) in enumerate(games):
+        moves[g, :len(game_moves)] = game_moves
+        length[g] = len(game_moves)
+        winner[g] = game_winner
+        agents[g] = agent_a, agent_b
+
+    # Bitboards de cada posición antes de cada jugada
+    reds = np.zeros((count, plies), dtype=np.uint64)
+    yellows = np.zeros((count, plies), dtype=np.uint64)
+    red = np.zeros(count, dtype=np.uint64)
+    yellow = np.zeros(count, dtype=np.uint64)
+    heights = np.zeros((count, COLS), dtype=np.int64)
+    rows = np.arange(count)
+    for t in range(plies):
+        reds[:, t], yellows[:, t] = red, yellow
+        col = moves[:, t]
+        idx = (col * H1 + heights[rows, col]).astype(np.uint64)
+        bit = np.where(t < length, np.uint64(1) << idx, np.uint64(0))
+        if t % 2 == 0:   # rojo mueve en t par
+            red = red | bit
+        else:
+            yellow = yellow | bit
+        heights[rows, col] += t < length
+
+    ply = np.arange(plies)
+    valid = ply[None, :] < length[:, None]
+
+    # Recompensa del que mueve en cada jugada: rojo (-1) en t par
+    mover = np.where(ply % 2 == 0, -1, 1)[None, :]
+    reward = np.where(winner[:, None] == mover, 1.0,
+                      np.where(winner[:, None] == -mover, -1.0, 0.0))
+
+    # Jugadas que faltan al mismo agente hasta el final de la partida
+    later = (length[:, None] - 1 - ply[None, :]) // 2
+    returns = reward * gamma ** later
+
+    if learners is not None:
+        mover_agent = np.where(ply % 2 == 0, agents[:, :1], agents[:, 1:])
+        valid &= np.isin(mover_agent, list(learners))
+
+    actions, returns = moves[valid], returns[valid]
+
+    # Orientación canónica, como canonical_key() en act()
+    keys, flip = canonical_keys_batch(reds[valid], yellows[valid])
+    actions = np.where(flip, COLS - 1 - actions, actions)
+    return keys, actions, returns
+
+
+def learn_batch(table, keys, actions, returns):
+    """Media incremental agrupada por estado: igual que add_return() uno a uno."""
+    states, inverse = np.unique(keys, return_inverse=True)
+    sums = np.zeros((len(states), COLS))
+    counts = np.zeros((len(states), COLS), dtype=np.int64)
+    np.add.at(sums, (inverse, actions), returns)
+    np.add.at(counts, (inverse, actions), 1)
+    table.merge_delta(states.tolist(), sums, counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Aprende la Q-table (FVMC) repasando logs de partidas, sin volver a jugarlas"
+    )
+    parser.add_argument("logs", nargs="+", help="logs de episode_log.py")
+    parser.add_argument("output", help="Q-table .bin de salida (compatible con load())")
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument("--agents", type=int, nargs="*", default=None,
+                        help="ids de los agentes que aprenden (por defecto todos)")
+    parser.add_argument("--init", default=None, help="Q-table .bin de partida")
+    parser.add_argument("--batch", type=int, default=4096, help="partidas por lote")
+    args = parser.parse_args()
+
+    table = QTable()
+    if args.init is not None:
+        table.load(args.init)
+
+    learners = None if args.agents is None else set(args.agents)
+    games = updates = 0
+    start = time.perf_counter()
+
+    for path in args.logs:
+        reader = EpisodeLogReader(path)
+        batch = []
+        for i in range(reader.chunks()):
+            batch.extend(reader.read_chunk(i))
+            if len(batch) >= args.batch or i == reader.chunks() - 1:
+                keys, actions, returns = replay_batch(batch, args.gamma, learners)
+                learn_batch(table, keys, actions, returns)
+                games += len(batch)
+                updates += len(keys)
+                batch = []
+
+    table.save(args.output)
+    seconds = time.perf_counter() - start
+    print(f"Partidas: {games} - actualizaciones (estado, acción): {updates}")
+    print(f"Estados: {len(table)} - entradas: {table.entries()}")
+    print(f"Tiempo: {seconds:.1f} s ({games / max(seconds, 1e-9):.0f} partidas/s)")
+
+
+if __name__ == "__main__":
+    main()
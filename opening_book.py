@@ -0,0 +1,90 @@
+import argparse
+import os
+import time
+
+from policy import (
+    BOOK_UNPROVEN, COLS, ROWS, ALjuriRuiz, OpeningBook, Solver, canonical_key, last_move_wins,
+    legal_moves, move_index, position_key,
+)
+
+
+def opening_positions(plies):
+    """
+    Posiciones (una por clave canónica) con hasta `plies` fichas, sin
+    ganador. Devuelve [(clave canónica, reflejada, rojo, amarillo, alturas)].
+    """
+    positions = []
+    seen = set()
+    frontier = [(0, 0, [0] * COLS)]
+    for ply in range(plies + 1):
+        player = -1 if ply % 2 == 0 else 1
+        following = []
+        for red, yellow, heights in frontier:
+            state, mirrored = canonical_key(position_key(red, yellow))
+            if state in seen:
+                continue
+            seen.add(state)
+            positions.append((state, mirrored, red, yellow, heights))
+            if ply == plies:
+                continue
+            for m in legal_moves(heights):
+                idx = move_index(heights, m)
+                child = list(heights)
+                child[m] += 1
+                if player == -1:
+                    if not last_move_wins(red | (1 << idx), idx):
+                        following.append((red | (1 << idx), yellow, child))
+                elif not last_move_wins(yellow | (1 << idx), idx):
+                    following.append((red, yellow | (1 << idx), child))
+        frontier = following
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Genera el libro de aperturas buscando cada posición con alpha-beta"
+    )
+    parser.add_argument("--plies", type=int, default=4,
+                        help="fichas máximas de las posiciones del libro")
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="tiempo de búsqueda por posición")
+    parser.add_argument("--output", default="opening_book.bin")
+    args = parser.parse_args()
+
+    positions = opening_positions(args.plies)
+    print(f"[INFO] {len(positions)} posiciones hasta {args.plies} fichas")
+
+    solver = Solver()
+    tactics = ALjuriRuiz.immediate_tactics
+    entries = {}
+    skipped = unproven = 0
+    start = time.perf_counter()
+    for i, (state, mirrored, red, yellow, heights) in enumerate(positions, 1):
+        if i % 100 == 0:
+            print(f"[INFO] {i}/{len(positions)} ({time.perf_counter() - start:.0f} s)")
+        player = -1 if sum(heights) % 2 == 0 else 1
+        # Con victoria o bloqueo inmediato act() nunca llega al libro
+        if tactics(red, yellow, heights, player, legal_moves(heights)) is not None:
+            skipped += 1
+            continue
+        move, score = solver.search(
+            red, yellow, heights, player, deadline=time.perf_counter() + args.seconds
+        )
+        # 0 sin llegar al final del tablero = sin resolver; las derrotas
+        # tampoco cuentan (sus puntuaciones son solo cotas): en ambos casos
+        # se guarda la jugada de la última profundidad como no demostrada
+        exact_draw = score == 0 and solver.last_stats["depth"] == ROWS * COLS - sum(heights)
+        if score < 0 or (score == 0 and not exact_draw):
+            unproven += 1
+            score = BOOK_UNPROVEN
+        entries[state] = (COLS - 1 - move if mirrored else move, score)
+
+    book = OpeningBook.build(entries, args.plies)
+    book.save(args.output)
+    print(f"Posiciones en el libro: {len(book)}, {book.proven()} demostradas "
+          f"({skipped} resueltas por tácticas, {unproven} sin demostrar)")
+    print(f"Tamaño: {os.path.getsize(args.output)} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,209 +1,1414 @@
 import numpy as np
-import hashlib
 import json
+import mmap
+import multiprocessing as mp
 import os
+import struct
+import time
 from connect4.policy import Policy
 
+
+# ---------------------------------------
+# BITBOARD
+# ---------------------------------------
+# Cada columna usa 7 bits (6 filas + 1 bit centinela), bit = col * 7 + fila,
+# con la fila 0 abajo. Rojo (-1) y amarillo (1) tienen cada uno su máscara
+# y las alturas de columna dicen dónde cae la siguiente ficha.
+
+ROWS = 6
+COLS = 7
+H1 = ROWS + 1
+
+# Peso de cada celda del tablero numpy (fila 0 = arriba) dentro del bitboard
+_CELL_SHIFTS = (
+    np.arange(COLS, dtype=np.uint64) * np.uint64(H1)
+    + np.arange(ROWS - 1, -1, -1, dtype=np.uint64)[:, None]
+)
+_CELL_BITS = np.uint64(1) << _CELL_SHIFTS
+
+
+def has_four(mask):
+    """True si la máscara contiene 4 en línea (shift-and-mask)."""
+    # Vertical
+    m = mask & (mask >> 1)
+    if m & (m >> 2):
+        return True
+    # Horizontal
+    m = mask & (mask >> H1)
+    if m & (m >> (2 * H1)):
+        return True
+    # Diagonal /
+    m = mask & (mask >> (H1 + 1))
+    if m & (m >> (2 * (H1 + 1))):
+        return True
+    # Diagonal \
+    m = mask & (mask >> (H1 - 1))
+    if m & (m >> (2 * (H1 - 1))):
+        return True
+    return False
+
+
+# Ventanas de 4 celdas (como máscaras) que pasan por cada bit del tablero
+LINES_THROUGH = [[] for _ in range(COLS * H1)]
+for _c in range(COLS):
+    for _r in range(ROWS):
+        for _dc, _dr in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            _cells = [(_c + i * _dc, _r + i * _dr) for i in range(4)]
+            if all(0 <= x < COLS and 0 <= y < ROWS for x, y in _cells):
+                _line = sum(1 << (x * H1 + y) for x, y in _cells)
+                for x, y in _cells:
+                    LINES_THROUGH[x * H1 + y].append(_line)
+LINES_THROUGH = [tuple(lines) for lines in LINES_THROUGH]
+
+
+def last_move_wins(mask, idx):
+    """True si la ficha recién puesta en el bit idx completa 4 en línea."""
+    for line in LINES_THROUGH[idx]:
+        if mask & line == line:
+            return True
+    return False
+
+
+def board_to_bitboards(board):
+    """Tablero numpy (6x7, -1/0/1) -> (rojo, amarillo, alturas)."""
+    red = int(np.bitwise_or.reduce(_CELL_BITS[board == -1]))
+    yellow = int(np.bitwise_or.reduce(_CELL_BITS[board == 1]))
+    heights = [int(h) for h in np.count_nonzero(board, axis=0)]
+    return red, yellow, heights
+
+
+def bitboards_to_board(red, yellow):
+    """Vista numpy del bitboard, compatible con Policy.act(board)."""
+    red_cells = (np.uint64(red) >> _CELL_SHIFTS) & np.uint64(1)
+    yellow_cells = (np.uint64(yellow) >> _CELL_SHIFTS) & np.uint64(1)
+    return yellow_cells.astype(int) - red_cells.astype(int)
+
+
+def bitboards_to_boards(red, yellow):
+    """bitboards_to_board() sobre arrays uint64 -> tableros (n, 6, 7)."""
+    red = np.asarray(red, dtype=np.uint64)[:, None, None]
+    yellow = np.asarray(yellow, dtype=np.uint64)[:, None, None]
+    red_cells = (red >> _CELL_SHIFTS) & np.uint64(1)
+    yellow_cells = (yellow >> _CELL_SHIFTS) & np.uint64(1)
+    return yellow_cells.astype(int) - red_cells.astype(int)
+
+
+def move_index(heights, col):
+    return col * H1 + heights[col]
+
+
+def legal_moves(heights):
+    return [c for c in range(COLS) if heights[c] < ROWS]
+
+
+BOTTOM = sum(1 << (c * H1) for c in range(COLS))
+
+
+def position_key(red, yellow):
+    """
+    Clave única (perfecta) de 64 bits de la posición: en cada columna queda
+    un 1 justo encima de la última ficha y, debajo, los bits de las rojas.
+    Es la clave de la Q-table, del árbol MCTS y de los episodios.
+    """
+    return red + (red | yellow) + BOTTOM
+
+
+def key_after(key, idx, player):
+    """
+    Clave tras soltar una ficha de player en el bit idx, sin recalcular:
+    la máscara suma el bit y, si la ficha es roja, también la parte roja.
+    """
+    return key + (2 << idx if player == -1 else 1 << idx)
+
+
+COLUMN_MASK = (1 << H1) - 1
+
+
+def mirror_key(key):
+    """Clave del tablero reflejado (columna c <-> 6 - c)."""
+    mirrored = 0
+    for c in range(COLS):
+        mirrored |= ((key >> (c * H1)) & COLUMN_MASK) << ((COLS - 1 - c) * H1)
+    return mirrored
+
+
+# Hash multiplicativo de Fibonacci para tablas indexadas por position_key
+# (TT del Solver, libro de aperturas, SharedQTable): los bits bajos de la
+# clave solo dependen de las primeras columnas, así que se multiplica
+# toda la clave y la ranura sale de los bits altos del producto
+FIB_HASH = 0x9E3779B97F4A7C15
+U64_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def canonical_key(key):
+    """
+    (clave canónica, reflejada): la Q-table guarda cada posición en la
+    orientación con la clave menor; si se reflejó, la acción a es 6 - a.
+    """
+    mirrored = mirror_key(key)
+    if mirrored < key:
+        return mirrored, True
+    return key, False
+
+
+def mirror_keys(keys):
+    """mirror_key() sobre un array uint64 de claves."""
+    keys = np.asarray(keys, dtype=np.uint64)
+    mirrored = np.zeros_like(keys)
+    for c in range(COLS):
+        column = (keys >> np.uint64(c * H1)) & np.uint64(COLUMN_MASK)
+        mirrored |= column << np.uint64((COLS - 1 - c) * H1)
+    return mirrored
+
+
+def canonical_keys_batch(red, yellow):
+    """
+    canonical_key(position_key(rojo, amarillo)) sobre arrays uint64 de
+    bitboards (de cualquier forma): (claves canónicas, reflejada).
+    """
+    keys = red + (red | yellow) + np.uint64(BOTTOM)
+    mirrored = mirror_keys(keys)
+    flip = mirrored < keys
+    return np.where(flip, mirrored, keys), flip
+
+
+# ---------------------------------------
+# ROLLOUTS EN LOTE (numpy)
+# ---------------------------------------
+
+_U64_SHIFTS = [
+    (np.uint64(d), np.uint64(2 * d)) for d in (1, H1, H1 + 1, H1 - 1)
+]
+_U64_ONE = np.uint64(1)
+
+
+def has_four_batch(masks):
+    """has_four sobre un array uint64 de máscaras -> array bool."""
+    found = np.zeros(masks.shape, dtype=bool)
+    for d, d2 in _U64_SHIFTS:
+        m = masks & (masks >> d)
+        found |= (m & (m >> d2)) != 0
+    return found
+
+
+def batch_rollouts(red, yellow, heights, player, n, rng=None, stats=None):
+    """
+    Juega n partidas aleatorias a la vez desde la posición dada (player
+    mueve primero). Devuelve un array con el resultado de cada partida:
+    -1 o 1 (ganador) o 2 (empate). Si se pasa stats (dict) se le suman
+    "rollouts" y "rollout_plies" (jugadas simuladas en total).
+    """
+    rng = np.random if rng is None else rng
+
+    mine, opp = (red, yellow) if player == -1 else (yellow, red)
+    cur = np.full(n, mine, dtype=np.uint64)
+    other = np.full(n, opp, dtype=np.uint64)
+    h = np.tile(np.asarray(heights, dtype=np.int64), (n, 1))
+
+    results = np.full(n, 2, dtype=np.int8)
+    active = np.arange(n)
+    p = player
+    plies = 0
+
+    while active.size:
+        legal = h < ROWS
+        open_games = legal.any(axis=1)
+        if not open_games.all():
+            # Tablero lleno = empate, esas partidas salen del lote
+            active, cur, other, h, legal = (
+                active[open_games], cur[open_games], other[open_games],
+                h[open_games], legal[open_games],
+            )
+            if not active.size:
+                break
+
+        # Columna aleatoria entre las legales de cada partida
+        noise = rng.random(legal.shape)
+        noise[~legal] = -1.0
+        cols = noise.argmax(axis=1)
+        rows = np.arange(active.size)
+        idx = cols * H1 + h[rows, cols]
+        cur |= _U64_ONE << idx.astype(np.uint64)
+        h[rows, cols] += 1
+        plies += active.size
+
+        won = has_four_batch(cur)
+        if won.any():
+            results[active[won]] = p
+            keep = ~won
+            active, cur, other, h = active[keep], cur[keep], other[keep], h[keep]
+
+        cur, other = other, cur
+        p = -p
+
+    if stats is not None:
+        stats["rollouts"] += n
+        stats["rollout_plies"] += plies
+    return results
+
+
+# ---------------------------------------
+# ÁRBOL MCTS CON TABLA DE TRANSPOSICIÓN
+# ---------------------------------------
+
+class SearchTree:
+    """
+    MCTS completo (selección, expansión, rollout en lote, backprop) cuyos
+    nodos se guardan por clave de posición: las transposiciones comparten
+    estadísticas y lo ya explorado se reutiliza en el siguiente act().
+    """
+
+    def __init__(self, c=1.41, batch=64, rollouts=None):
+        self.c = c
+        self.batch = batch
+        # rollouts(red, yellow, heights, player, n) -> resultados; por
+        # defecto en este proceso, o repartidos en un pool (leaf-parallel)
+        self.rollouts = batch_rollouts if rollouts is None else rollouts
+        self.rollout_stats = None   # dict de ActStats si está activado
+        # clave -> [jugadas, victorias del jugador que movió hacia el nodo,
+        #           fichas en el tablero, resultado si es terminal (0 si no)]
+        self.nodes = {}
+        self.root_stones = 0
+        self.last_iterations = 0
+
+    def clear(self):
+        self.nodes = {}
+        self.root_stones = 0
+
+    def prune(self, stones):
+        # Las posiciones con menos fichas que la raíz ya no pueden volver
+        self.nodes = {k: v for k, v in self.nodes.items() if v[2] >= stones}
+
+    def search(self, red, yellow, heights, player, iterations=None, deadline=None):
+        """
+        Itera hasta completar `iterations` o hasta `deadline` (perf_counter),
+        lo que ocurra primero; siempre hace al menos una iteración.
+        Devuelve {jugada: (victorias, jugadas)} de los hijos de la raíz.
+        """
+        stones = sum(heights)
+        if stones < self.root_stones:
+            self.clear()   # raíz con menos fichas = partida nueva
+        else:
+            self.prune(stones)
+        self.root_stones = stones
+        root_key = position_key(red, yellow)
+        if root_key not in self.nodes:
+            self.nodes[root_key] = [0, 0.0, stones, 0]
+
+        done = 0
+        while True:
+            self._iterate(red, yellow, list(heights), player, root_key)
+            done += 1
+            if iterations is not None and done >= iterations:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.last_iterations = done
+
+        stats = {}
+        for m in legal_moves(heights):
+            child = self.nodes.get(key_after(root_key, move_index(heights, m), player))
+            stats[m] = (child[1], child[0]) if child is not None else (0.0, 0)
+        return stats
+
+    def _iterate(self, red, yellow, h, p, key):
+        nodes = self.nodes
+        path = [nodes[key]]
+        movers = [-p]
+
+        while True:
+            node = nodes[key]
+            if node[3] != 0:
+                results = node[3]
+                break
+
+            legal = legal_moves(h)
+            if not legal:
+                node[3] = 2
+                results = 2
+                break
+
+            # Selección: primero hijos sin expandir, luego UCB
+            chosen = None
+            best_score = -1.0
+            log_n = np.log(node[0] + 1)
+            for m in legal:
+                child = nodes.get(key_after(key, move_index(h, m), p))
+                if child is None:
+                    chosen = m
+                    break
+                score = child[1] / child[0] + self.c * np.sqrt(log_n / child[0])
+                if score > best_score:
+                    best_score = score
+                    chosen = m
+
+            idx = move_index(h, chosen)
+            if p == -1:
+                red |= 1 << idx
+                mover_mask = red
+            else:
+                yellow |= 1 << idx
+                mover_mask = yellow
+            h[chosen] += 1
+            key = key_after(key, idx, p)
+
+            child = nodes.get(key)
+            expanded = child is None
+            if expanded:
+                terminal = p if last_move_wins(mover_mask, idx) else 0
+                child = nodes[key] = [0, 0.0, sum(h), terminal]
+            path.append(child)
+            movers.append(p)
+            p = -p
+
+            if expanded:
+                # Expansión: rollouts en lote desde el nuevo nodo
+                if child[3] != 0:
+                    results = child[3]
+                elif self.rollout_stats is None:
+                    results = self.rollouts(red, yellow, h, p, self.batch)
+                else:
+                    results = self.rollouts(
+                        red, yellow, h, p, self.batch, stats=self.rollout_stats
+                    )
+                break
+
+        # Backpropagation
+        n = self.batch
+        if isinstance(results, np.ndarray):
+            red_wins = np.count_nonzero(results == -1)
+            yellow_wins = np.count_nonzero(results == 1)
+            draws = n - red_wins - yellow_wins
+        else:
+            red_wins = n if results == -1 else 0
+            yellow_wins = n if results == 1 else 0
+            draws = n if results == 2 else 0
+
+        for node, mover in zip(path, movers):
+            node[0] += n
+            node[1] += (red_wins if mover == -1 else yellow_wins) + 0.5 * draws
+
+
+# ---------------------------------------
+# NEGAMAX ALPHA-BETA CON TABLA DE TRANSPOSICIÓN
+# ---------------------------------------
+# Puntuación desde el jugador que mueve: ganar con la ficha número s vale
+# (43 - s) // 2 (ganar antes vale más), empate u horizonte = 0, perder es
+# el negativo. Una puntuación distinta de 0 es un resultado demostrado.
+
+MOVE_ORDER = (3, 2, 4, 1, 5, 0, 6)   # centro primero
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class Solver:
+    """
+    Negamax alpha-beta con profundización iterativa. La tabla de
+    transposición tiene tamaño fijo (2**tt_bits ranuras) y en cada ranura
+    se queda la entrada más profunda o la de la búsqueda más reciente.
+    """
+
+    def __init__(self, tt_bits=20):
+        self.tt_shift = 64 - tt_bits
+        self.tt = [None] * (1 << tt_bits)
+        self.generation = 0
+        self.deadline = None
+        self.max_nodes = None
+        self.nodes = 0
+        self.root_scores = {}
+        self.last_stats = {}
+
+    def clear(self):
+        self.tt = [None] * len(self.tt)
+
+    def search(self, red, yellow, heights, player, max_depth=None, deadline=None,
+               max_nodes=None):
+        """
+        Profundiza de 1 a max_depth (o hasta llenar el tablero) mientras no
+        pase el deadline (perf_counter) ni visite más de max_nodes nodos.
+        Devuelve (jugada, puntuación) de la última profundidad completada;
+        root_scores tiene la de cada jugada (cotas superiores <= -1 para
+        las jugadas que pierden).
+        """
+        cur, opp = (red, yellow) if player == -1 else (yellow, red)
+        mask = cur | opp
+        stones = sum(heights)
+        h = list(heights)
+        limit = ROWS * COLS - stones
+        if max_depth is not None:
+            limit = min(limit, max_depth)
+
+        self.generation += 1
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        start = time.perf_counter()
+
+        order = [c for c in MOVE_ORDER if h[c] < ROWS]
+        best, best_score, depth_done = order[0], 0, 0
+        self.root_scores = {}
+        for depth in range(1, limit + 1):
+            try:
+                scores = self._root(cur, mask, h, stones, depth, order)
+            except _SearchTimeout:
+                break
+            self.root_scores = scores
+            depth_done = depth
+            # Siguiente iteración: mejores jugadas primero
+            order = sorted(order, key=lambda c: -scores[c])
+            best, best_score = order[0], scores[order[0]]
+            if best_score != 0:
+                break   # victoria/derrota demostrada, no cambia con más profundidad
+
+        seconds = time.perf_counter() - start
+        self.last_stats = {
+            "depth": depth_done,
+            "nodes": self.nodes,
+            "seconds": seconds,
+            "nodes_per_second": self.nodes / max(seconds, 1e-9),
+            "score": best_score,
+        }
+        return best, best_score
+
+    def _root(self, cur, mask, h, stones, depth, order):
+        scores = {}
+        best = -ROWS * COLS
+        beta = ROWS * COLS
+        for c in order:
+            idx = c * H1 + h[c]
+            if last_move_wins(cur | (1 << idx), idx):
+                scores[c] = (ROWS * COLS + 1 - stones) // 2
+            else:
+                # alpha = -1 mientras no haya victoria: separa las jugadas
+                # que pierden (<= -1) de las que empatan o no se resuelven
+                alpha = max(best, -1)
+                h[c] += 1
+                scores[c] = -self._negamax(
+                    cur ^ mask, mask | (1 << idx), h, stones + 1, depth - 1, -beta, -alpha
+                )
+                h[c] -= 1
+            best = max(best, scores[c])
+        return scores
+
+    def _negamax(self, cur, mask, h, stones, depth, alpha, beta):
+        self.nodes += 1
+        if (self.nodes & 1023) == 0 and (
+                (self.deadline is not None and time.perf_counter() >= self.deadline)
+                or (self.max_nodes is not None and self.nodes >= self.max_nodes)):
+            raise _SearchTimeout()
+
+        if stones == ROWS * COLS:
+            return 0
+
+        moves = [c for c in MOVE_ORDER if h[c] < ROWS]
+        for c in moves:
+            idx = c * H1 + h[c]
+            if last_move_wins(cur | (1 << idx), idx):
+                return (ROWS * COLS + 1 - stones) // 2
+        if depth == 0:
+            return 0
+
+        # Sin victoria inmediata lo mejor es ganar con la siguiente ficha propia
+        max_score = (ROWS * COLS - 1 - stones) // 2
+        if beta > max_score:
+            beta = max_score
+            if alpha >= beta:
+                return beta
+
+        alpha_orig = alpha
+        key = cur + mask
+        slot = ((key * FIB_HASH) & U64_MASK) >> self.tt_shift
+        entry = self.tt[slot]
+        if entry is not None and entry[0] == key:
+            _, e_depth, flag, score, move, _ = entry
+            if e_depth >= depth:
+                if flag == _EXACT:
+                    return score
+                if flag == _LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            if move in moves:
+                moves.remove(move)
+                moves.insert(0, move)
+
+        best, best_move = -ROWS * COLS, moves[0]
+        for c in moves:
+            idx = c * H1 + h[c]
+            h[c] += 1
+            score = -self._negamax(
+                cur ^ mask, mask | (1 << idx), h, stones + 1, depth - 1, -beta, -alpha
+            )
+            h[c] -= 1
+            if score > best:
+                best, best_move = score, c
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best <= alpha_orig:
+            flag = _UPPER
+        elif best >= beta:
+            flag = _LOWER
+        else:
+            flag = _EXACT
+        # Reemplazo: entrada vacía, de una búsqueda anterior o menos profunda
+        if entry is None or entry[5] != self.generation or entry[1] <= depth:
+            self.tt[slot] = (key, depth, flag, best, best_move, self.generation)
+        return best
+
+
+# ---------------------------------------
+# MCTS PARALELO (pool de procesos)
+# ---------------------------------------
+# root-parallel: cada worker busca con su propio árbol desde la misma raíz
+# y al final se suman victorias/jugadas por jugada.
+# leaf-parallel: un solo árbol, pero cada lote de rollouts se reparte.
+
+_WORKER_TREE = None
+
+
+def _worker_init():
+    global _WORKER_TREE
+    np.random.seed()   # cada worker con su propia semilla (fork copia el RNG)
+    _WORKER_TREE = SearchTree()
+
+
+def _root_search(args):
+    red, yellow, heights, player, iterations, budget, count_rollouts = args
+    deadline = None if budget is None else time.perf_counter() + budget
+    # Contadores de rollouts solo si el proceso principal tiene ActStats
+    rollouts = {"rollouts": 0, "rollout_plies": 0} if count_rollouts else None
+    _WORKER_TREE.rollout_stats = rollouts
+    stats = _WORKER_TREE.search(red, yellow, heights, player, iterations, deadline)
+    return stats, _WORKER_TREE.last_iterations, rollouts
+
+
+def _leaf_rollouts(args):
+    red, yellow, heights, player, n = args
+    stats = {"rollouts": 0, "rollout_plies": 0}
+    return batch_rollouts(red, yellow, heights, player, n, stats=stats), stats["rollout_plies"]
+
+
+class PoolRollouts:
+    """Reparte cada lote de rollouts entre los workers del pool."""
+
+    def __init__(self, pool, workers):
+        self.pool = pool
+        self.workers = workers
+
+    def __call__(self, red, yellow, heights, player, n, stats=None):
+        chunk = -(-n // self.workers)
+        jobs = [(red, yellow, heights, player, chunk)] * self.workers
+        parts = self.pool.map(_leaf_rollouts, jobs)
+        if stats is not None:
+            stats["rollouts"] += chunk * self.workers
+            stats["rollout_plies"] += sum(plies for _, plies in parts)
+        return np.concatenate([results for results, _ in parts])[:n]
+
+
+# ---------------------------------------
+# Q-TABLE BINARIA
+# ---------------------------------------
+# Formato .bin v2 (little-endian), un registro por estado:
+#   cabecera  "<4sHHI": b"C4QT", versión, ancho de clave, número de estados
+#             "<I": número de pares (estado, acción) guardados
+#   claves    n claves ordenadas: uint64 (position_key) si el ancho es 8;
+#             las tablas antiguas usan el digest SHA1 crudo (ancho 20)
+#   máscara   n uint8, bit a encendido = la acción a tiene Q/N
+#   inicio    n uint32, posición del primer valor del estado en Q/N
+#   Q         m float32, valores de las acciones visitadas de cada estado
+#   N         m uint32
+# Solo se guardan las acciones visitadas; lookup() devuelve vectores de 7.
+# load() también lee la versión 1 (una fila por (estado, acción)).
+
+QTABLE_MAGIC = b"C4QT"
+QTABLE_VERSION = 2
+QTABLE_HEADER = struct.Struct("<4sHHI")
+QTABLE_ENTRIES = struct.Struct("<I")
+KEY_WIDTH = 8
+SHA1_WIDTH = 20
+
+# Acciones presentes en cada máscara de 7 bits
+_MASK_ACTIONS = [
+    np.array([a for a in range(COLS) if m >> a & 1], dtype=np.int64)
+    for m in range(1 << COLS)
+]
+_ACTION_BITS = (1 << np.arange(COLS)).astype(np.uint8)
+_POPCOUNT8 = np.array([bin(m).count("1") for m in range(256)], dtype=np.int64)
+
+
+def encode_states(states):
+    """Claves de posición (int) -> array uint64 de la tabla."""
+    return np.array(states, dtype="<u8")
+
+
+def decode_state(key):
+    return int(key)
+
+
+def encode_sha1_states(states):
+    """Claves sha1 hex de las tablas antiguas -> digest de 20 bytes."""
+    return np.array([bytes.fromhex(s) for s in states], dtype=f"S{SHA1_WIDTH}")
+
+
+def decode_sha1_state(key):
+    return bytes(key).ljust(SHA1_WIDTH, b"\0").hex()
+
+
+class PackedQTable:
+    """Q-table en arrays ordenados por estado; se consulta con búsqueda binaria."""
+
+    def __init__(self, keys, mask, start, q, n):
+        self.keys = keys
+        self.mask = mask
+        self.start = start
+        self.q = q
+        self.n = n
+
+    def __len__(self):
+        return len(self.keys)
+
+    def entries(self):
+        return len(self.q)
+
+    @classmethod
+    def empty(cls):
+        return cls.from_dense(
+            encode_states([]),
+            np.zeros((0, COLS), dtype="<f4"),
+            np.zeros((0, COLS), dtype="<u4"),
+        )
+
+    @classmethod
+    def from_dense(cls, keys, q, n):
+        """Desde vectores de 7 por estado (N = 0: acción sin datos)."""
+        order = np.argsort(keys, kind="stable")
+        keys, q, n = keys[order], q[order], n[order]
+        visited = n > 0
+        mask = (visited * _ACTION_BITS).sum(axis=1).astype(np.uint8)
+        counts = visited.sum(axis=1)
+        start = np.zeros(len(keys), dtype="<u4")
+        np.cumsum(counts[:-1], out=start[1:])
+        return cls(keys, mask, start, q[visited].astype("<f4"), n[visited].astype("<u4"))
+
+    def to_dense(self):
+        """(Q, N) como matrices de estados x 7 acciones."""
+        q = np.zeros((len(self), COLS), dtype="<f4")
+        n = np.zeros((len(self), COLS), dtype="<u4")
+        visited = (self.mask[:, None] & _ACTION_BITS) != 0
+        q[visited] = self.q
+        n[visited] = self.n
+        return q, n
+
+    @classmethod
+    def from_pairs(cls, keys, actions, q, n):
+        """Agrupa filas (estado, acción) en un registro por estado."""
+        states, rows = np.unique(keys, return_inverse=True)
+        q_vec = np.zeros((len(states), COLS), dtype="<f4")
+        n_vec = np.zeros((len(states), COLS), dtype="<u4")
+        q_vec[rows, actions] = q
+        n_vec[rows, actions] = n
+        return cls.from_dense(states, q_vec, n_vec)
+
+    @classmethod
+    def from_json(cls, path):
+        """Formato anterior (claves SHA1): {"Q": {"<sha1>|<a>": q}, "N": {...}}."""
+        with open(path, "r") as f:
+            data = json.load(f)
+        pairs = [key.split("|") for key in data["Q"]]
+        return cls.from_pairs(
+            encode_sha1_states([s for s, _ in pairs]),
+            np.array([int(a) for _, a in pairs], dtype=np.int64),
+            np.array(list(data["Q"].values()), dtype="<f4"),
+            np.array([data["N"][key] for key in data["Q"]], dtype="<u4"),
+        )
+
+    @staticmethod
+    def _read_header(path, f):
+        magic, version, width, count = QTABLE_HEADER.unpack(f.read(QTABLE_HEADER.size))
+        if magic != QTABLE_MAGIC or version not in (1, QTABLE_VERSION):
+            raise ValueError(f"{path} no es una Q-table C4QT")
+        entries = count
+        if version == QTABLE_VERSION:
+            (entries,) = QTABLE_ENTRIES.unpack(f.read(QTABLE_ENTRIES.size))
+        return version, width, count, entries
+
+    def _columns(self):
+        return (self.keys, self.mask, self.start, self.q, self.n)
+
+    @staticmethod
+    def _dtypes(width):
+        key_dtype = "<u8" if width == KEY_WIDTH else f"S{width}"
+        return (key_dtype, np.uint8, "<u4", "<f4", "<u4")
+
+    def has_sha1_keys(self):
+        return self.keys.dtype.kind == "S"
+
+    @classmethod
+    def open(cls, path):
+        """
+        Abre la tabla como memory map de solo lectura: no se parsea nada,
+        las páginas se leen al consultar y varios procesos comparten la
+        misma copia en la page cache.
+        """
+        with open(path, "rb") as f:
+            version, width, count, entries = cls._read_header(path, f)
+            if version != QTABLE_VERSION:
+                return cls.load(path)   # versión 1: se convierte en memoria
+            offset = f.tell()
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        columns = []
+        for i, dtype in enumerate(cls._dtypes(width)):
+            size = count if i < 3 else entries
+            column = np.frombuffer(buf, dtype=dtype, count=size, offset=offset)
+            columns.append(column)
+            offset += column.nbytes
+        return cls(*columns)
+
+    @classmethod
+    def load(cls, path):
+        """Lee la tabla completa a memoria (para entrenar y modificarla)."""
+        if path.endswith(".json"):
+            return cls.from_json(path)
+        with open(path, "rb") as f:
+            version, width, count, entries = cls._read_header(path, f)
+            if version == 1:
+                keys = np.fromfile(f, dtype=f"S{width}", count=count)
+                actions = np.fromfile(f, dtype=np.uint8, count=count)
+                q = np.fromfile(f, dtype="<f4", count=count)
+                n = np.fromfile(f, dtype="<u4", count=count)
+                return cls.from_pairs(keys, actions, q, n)
+            columns = [
+                np.fromfile(f, dtype=dtype, count=count if i < 3 else entries)
+                for i, dtype in enumerate(cls._dtypes(width))
+            ]
+        return cls(*columns)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(QTABLE_HEADER.pack(
+                QTABLE_MAGIC, QTABLE_VERSION, self.keys.dtype.itemsize, len(self)
+            ))
+            f.write(QTABLE_ENTRIES.pack(self.entries()))
+            for column, dtype in zip(self._columns(), self._dtypes(self.keys.dtype.itemsize)):
+                f.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+
+    def lookup(self, state):
+        """(vector Q, vector N) del estado (position_key), o None si no está."""
+        k = np.uint64(state)
+        i = np.searchsorted(self.keys, k)
+        if i == len(self.keys) or self.keys[i] != k:
+            return None
+        actions = _MASK_ACTIONS[self.mask[i]]
+        first = int(self.start[i])
+        q = np.zeros(COLS)
+        n = np.zeros(COLS, dtype=np.uint32)
+        q[actions] = self.q[first:first + len(actions)]
+        n[actions] = self.n[first:first + len(actions)]
+        return q, n
+
+    def lookup_batch(self, states):
+        """
+        lookup() sobre un array uint64 de claves: (Q, N) de estados x 7,
+        con N = 0 en los estados que no están.
+        """
+        keys = np.asarray(states, dtype=np.uint64)
+        q = np.zeros((len(keys), COLS))
+        n = np.zeros((len(keys), COLS), dtype=np.uint32)
+        if not len(self) or not len(keys):
+            return q, n
+        i = np.minimum(np.searchsorted(self.keys, keys), len(self) - 1)
+        rows = np.flatnonzero(self.keys[i] == keys)
+        mask = np.asarray(self.mask[i[rows]])
+        first = np.asarray(self.start[i[rows]], dtype=np.int64)
+        for a in range(COLS):
+            # La acción a está en el CSR después de las acciones menores del estado
+            has = (mask >> a) & 1 != 0
+            entry = first[has] + _POPCOUNT8[mask[has] & ((1 << a) - 1)]
+            q[rows[has], a] = self.q[entry]
+            n[rows[has], a] = self.n[entry]
+        return q, n
+
+
+# ---------------------------------------
+# LIBRO DE APERTURAS
+# ---------------------------------------
+# Formato .bin (little-endian), tabla hash con direccionamiento abierto:
+#   cabecera  "<4sHHI": b"C4OB", versión, plies cubiertos, número de ranuras
+#             (potencia de 2)
+#   claves    ranuras uint64: clave canónica de la posición (0 = vacía; una
+#             position_key nunca es 0)
+#   jugadas   ranuras uint8: columna a jugar, en la orientación canónica
+#   puntos    ranuras int8: puntuación del Solver (> 0 victoria, 0 empate)
+#             o BOOK_UNPROVEN
+# Las posiciones demostradas (victoria o empate exacto) van antes que la
+# Q-table. El resto guarda la jugada de la búsqueda más profunda que
+# terminó, marcada BOOK_UNPROVEN: una búsqueda cortada por tiempo no
+# sabe quién gana y esa jugada no debe tapar a la Q-table, así que act()
+# solo la usa si la Q-table no conoce el estado. La ranura es
+# hash(clave) y las colisiones siguen en la siguiente (sondeo lineal); con
+# la tabla a medio llenar lookup() es O(1). Se genera offline con
+# opening_book.py.
+
+BOOK_MAGIC = b"C4OB"
+BOOK_VERSION = 3
+BOOK_HEADER = struct.Struct("<4sHHI")
+BOOK_UNPROVEN = -128   # puntuación de las jugadas sin demostrar
+
+
+def _book_slot(key, slot_mask):
+    return (((key * FIB_HASH) & U64_MASK) >> 32) & slot_mask
+
+
+class OpeningBook:
+
+    def __init__(self, keys, moves, scores, plies=0):
+        self.keys = keys
+        self.moves = moves
+        self.scores = scores
+        self.plies = plies
+        self.slot_mask = len(keys) - 1
+
+    def __len__(self):
+        return int(np.count_nonzero(self.keys))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(1, dtype="<u8"), np.zeros(1, dtype=np.uint8),
+                   np.zeros(1, dtype=np.int8))
+
+    @classmethod
+    def build(cls, entries, plies):
+        """
+        entries = {clave canónica: (jugada, puntuación)}, con
+        BOOK_UNPROVEN en las no demostradas; ocupa como mucho media tabla.
+        """
+        slots = 1
+        while slots < 2 * max(len(entries), 1):
+            slots *= 2
+        keys = np.zeros(slots, dtype="<u8")
+        moves = np.zeros(slots, dtype=np.uint8)
+        scores = np.zeros(slots, dtype=np.int8)
+        for key, (move, score) in entries.items():
+            slot = _book_slot(key, slots - 1)
+            while keys[slot] != 0:
+                slot = (slot + 1) & (slots - 1)
+            keys[slot] = key
+            moves[slot] = move
+            scores[slot] = score
+        return cls(keys, moves, scores, plies)
+
+    @classmethod
+    def open(cls, path):
+        """Memory map de solo lectura, igual que PackedQTable.open()."""
+        with open(path, "rb") as f:
+            magic, version, plies, slots = BOOK_HEADER.unpack(f.read(BOOK_HEADER.size))
+            if magic != BOOK_MAGIC or version != BOOK_VERSION:
+                raise ValueError(f"{path} no es un libro de aperturas C4OB")
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        keys = np.frombuffer(buf, dtype="<u8", count=slots, offset=BOOK_HEADER.size)
+        moves = np.frombuffer(buf, dtype=np.uint8, count=slots,
+                              offset=BOOK_HEADER.size + keys.nbytes)
+        scores = np.frombuffer(buf, dtype=np.int8, count=slots,
+                               offset=BOOK_HEADER.size + keys.nbytes + moves.nbytes)
+        return cls(keys, moves, scores, plies)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, self.plies, len(self.keys)))
+            f.write(np.ascontiguousarray(self.keys, dtype="<u8").tobytes())
+            f.write(np.ascontiguousarray(self.moves, dtype=np.uint8).tobytes())
+            f.write(np.ascontiguousarray(self.scores, dtype=np.int8).tobytes())
+
+    def proven(self):
+        """Número de posiciones demostradas."""
+        return int(np.count_nonzero((self.keys != 0) & (self.scores != BOOK_UNPROVEN)))
+
+    def lookup(self, state, unproven=False):
+        """
+        Jugada del libro para la clave canónica, o None si no está. Las
+        jugadas sin demostrar solo se devuelven con unproven=True.
+        """
+        slot = _book_slot(state, self.slot_mask)
+        while True:
+            key = int(self.keys[slot])
+            if key == state:
+                if not unproven and self.scores[slot] == BOOK_UNPROVEN:
+                    return None
+                return int(self.moves[slot])
+            if key == 0:
+                return None
+            slot = (slot + 1) & self.slot_mask
+
+
+# ---------------------------------------
+# TABLEBASE DE FINALES
+# ---------------------------------------
+# Con pocas casillas vacías act() resuelve la posición de forma exacta con
+# el Solver y guarda el resultado; el archivo crece entre ejecuciones.
+# Formato: registros "<QBb" añadidos al final del archivo (append-only):
+#   clave canónica, jugada (orientación canónica), puntuación del Solver
+#   (> 0 gana, 0 empata, < 0 pierde)
+
+TABLEBASE_RECORD = np.dtype([("key", "<u8"), ("move", "u1"), ("score", "i1")])
+
+
+class Tablebase:
+
+    def __init__(self, path=None):
+        self.path = path
+        self.results = {}   # clave canónica -> (jugada, puntuación)
+        self.writable = path is not None
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            # Un registro a medias (escritura interrumpida) se descarta
+            usable = len(data) - len(data) % TABLEBASE_RECORD.itemsize
+            records = np.frombuffer(data[:usable], dtype=TABLEBASE_RECORD)
+            self.results = dict(zip(
+                records["key"].tolist(),
+                zip(records["move"].tolist(), records["score"].tolist()),
+            ))
+
+    def __len__(self):
+        return len(self.results)
+
+    def lookup(self, state):
+        """(jugada, puntuación) de la clave canónica, o None."""
+        return self.results.get(state)
+
+    def store(self, state, move, score):
+        self.results[state] = (move, score)
+        if not self.writable:
+            return
+        record = np.array([(state, move, score)], dtype=TABLEBASE_RECORD)
+        try:
+            with open(self.path, "ab") as f:
+                f.write(record.tobytes())
+        except:
+            print(f"[WARNING] No se pudo escribir {self.path}. La tablebase queda en memoria.")
+            self.writable = False
+
+
+# ---------------------------------------
+# INSTRUMENTACIÓN DE act()
+# ---------------------------------------
+
+class ActStats:
+    """
+    Contadores de act() por etapa: jugadas y tiempo de las jugadas que
+    decidió cada etapa (incluye lo que costaron las etapas anteriores),
+    aciertos del libro, la Q-table y la tablebase, iteraciones MCTS, nodos
+    alpha-beta y largo de los rollouts. Se activa con
+    policy.enable_stats(); apagado, act() solo mira si stats es None. Los
+    rollouts incluyen los de los workers (modos "leaf" y "root").
+    """
+
+    STAGES = ("tactics", "book", "endgame", "qtable", "search")
+
+    def __init__(self, log_every=0):
+        self.log_every = log_every   # cada cuántas jugadas imprimir log_line()
+        self.moves = 0
+        self.stage_moves = dict.fromkeys(self.STAGES, 0)
+        self.stage_seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.lookups = {"book_hits": 0, "book_misses": 0, "qtable_hits": 0,
+                        "qtable_misses": 0, "tablebase_hits": 0, "tablebase_misses": 0}
+        self.search = {"mcts_moves": 0, "mcts_iterations": 0, "mcts_iterations_max": 0,
+                       "solver_moves": 0, "solver_nodes": 0}
+        self.rollouts = {"rollouts": 0, "rollout_plies": 0}
+
+    def snapshot(self):
+        moves = max(self.moves, 1)
+        return {
+            "moves": self.moves,
+            "stage_share": {s: self.stage_moves[s] / moves for s in self.STAGES},
+            "stage_ms_mean": {
+                s: 1e3 * self.stage_seconds[s] / max(self.stage_moves[s], 1)
+                for s in self.STAGES
+            },
+            "stage_ms_total": {s: 1e3 * self.stage_seconds[s] for s in self.STAGES},
+            **self.lookups,
+            **self.search,
+            "mcts_iterations_mean": self.search["mcts_iterations"] / max(self.search["mcts_moves"], 1),
+            **self.rollouts,
+            "rollout_length_mean": self.rollouts["rollout_plies"] / max(self.rollouts["rollouts"], 1),
+        }
+
+    def log_line(self):
+        snap = self.snapshot()
+        stages = " ".join(
+            f"{s}={snap['stage_share'][s]:.0%}/{snap['stage_ms_mean'][s]:.1f}ms"
+            for s in self.STAGES
+        )
+        return (f"[INFO] act: {snap['moves']} jugadas | {stages} | "
+                f"Q hit {snap['qtable_hits']}/{snap['qtable_hits'] + snap['qtable_misses']} | "
+                f"MCTS {snap['mcts_iterations_mean']:.0f} it/jugada | "
+                f"rollout {snap['rollout_length_mean']:.1f} jugadas")
+
+
 class ALjuriRuiz(Policy):
 
-    def __init__(self, gamma=0.99, q_filename="Q_table_NuevoCleaned.json"):
+    ITER = 50           # iteraciones MCTS por jugada si no hay time_out
+    TIME_MARGIN = 0.15  # fracción del time_out que se deja libre por seguridad
+    SOLVER_DEPTH = 8    # profundidad alpha-beta si no hay time_out
+    SOLVER_SHARE = 0.5  # fracción del tiempo para alpha-beta en modo "hybrid"
+    ENDGAME_EMPTY = 16  # casillas vacías desde las que se resuelve exacto
+    ENDGAME_NODES = 20000  # tope de nodos del final si no hay time_out
+
+    def __init__(self, gamma=0.99, q_filename="Q_table_NuevoCleaned.bin",
+                 workers=0, parallel="root", engine="mcts",
+                 book_filename="opening_book.bin",
+                 tablebase_filename=None):
         # Memoria entre partidas (ya entrenada)
-        self.Q = {}
-        self.N = {}
+        self.table = PackedQTable.empty()
+        self.book = OpeningBook.empty()
         self.gamma = gamma
+        self.tree = SearchTree()
+        self.time_out = None
+        self.search_log = []   # (iteraciones, segundos) de cada búsqueda
+        self.stats = None      # ActStats con enable_stats(); None = sin coste
+
+        # Motor de búsqueda: "mcts", "alphabeta" o "hybrid" (alpha-beta y,
+        # si no demuestra nada, MCTS entre las jugadas que no pierden)
+        if engine not in ("mcts", "alphabeta", "hybrid"):
+            raise ValueError(f"Motor de búsqueda desconocido: {engine}")
+        self.engine = engine
+        self.solver = Solver()
+        self.solver_log = []   # last_stats del Solver en cada búsqueda
+
+        # MCTS paralelo: workers > 0 procesos, modo "root" o "leaf"
+        if parallel not in ("root", "leaf"):
+            raise ValueError(f"Modo paralelo desconocido: {parallel}")
+        self.workers = workers
+        self.parallel = parallel
+        self.pool = None
+        self.last_stage = None   # etapa que decidió la última jugada
+        self.endgame_result = None   # "tablebase", "solved" o "unsolved"
 
         # Construir ruta absoluta al archivo dentro del paquete
-        base_path = os.path.dirname(__file__)      
+        base_path = os.path.dirname(__file__)
         q_path = os.path.join(base_path, q_filename)
 
-        # Cargar la memoria aprendida
+        # Abrir la memoria aprendida como memory map (se consulta bajo
+        # demanda en act())
         try:
-            with open(q_path, "r") as f:
-                data = json.load(f)
-            for key, val in data["Q"].items():
-                s, a = key.split("|")
-                self.Q[(s, int(a))] = val
-            for key, val in data["N"].items():
-                s, a = key.split("|")
-                self.N[(s, int(a))] = val
-            print("[INFO] Q-table cargada con", len(self.Q), "entradas")
+            table = PackedQTable.open(q_path)
+            if table.has_sha1_keys():
+                print(f"[WARNING] {q_filename} usa claves SHA1 (migrar con "
+                      "migrate_qtable_keys.py). Se jugará sin memoria.")
+            else:
+                self.table = table
+                print("[INFO] Q-table cargada con", len(self.table), "estados")
         except:
-            print("[WARNING] No se encontró Q_table.json. Se jugará sin memoria.")
+            print(f"[WARNING] No se encontró {q_filename}. Se jugará sin memoria.")
+
+        # Libro de aperturas (opcional), también como memory map
+        try:
+            self.book = OpeningBook.open(os.path.join(base_path, book_filename))
+            print(f"[INFO] Libro de aperturas cargado con {len(self.book)} posiciones "
+                  f"({self.book.proven()} demostradas)")
+        except:
+            print(f"[WARNING] No se encontró {book_filename}. Se jugará sin libro.")
+
+        # Tablebase de finales: con tablebase_filename se lee entera y se le
+        # añaden los nuevos resultados exactos; sin él, solo en memoria
+        if tablebase_filename is None:
+            self.tablebase = Tablebase()
+        else:
+            self.tablebase = Tablebase(os.path.join(base_path, tablebase_filename))
+        if len(self.tablebase):
+            print("[INFO] Tablebase cargada con", len(self.tablebase), "posiciones")
 
     # UTILIDADES
 
     def encode(self, board):
-        return hashlib.sha1(board.tobytes()).hexdigest()
+        red, yellow, _ = board_to_bitboards(board)
+        return canonical_key(position_key(red, yellow))[0]
 
     def mount(self, time_out=None):
-        pass
+        # time_out = segundos por jugada; None = ITER iteraciones fijas
+        self.time_out = time_out
+        self.tree.clear()
+        self.solver.clear()
+
+        # El pool se crea una sola vez y se reutiliza en todas las jugadas
+        if self.workers > 0 and self.pool is None:
+            self.pool = mp.Pool(self.workers, initializer=_worker_init)
+            if self.parallel == "leaf":
+                self._replace_tree(SearchTree(
+                    batch=self.tree.batch * self.workers,
+                    rollouts=PoolRollouts(self.pool, self.workers),
+                ))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self._replace_tree(SearchTree())
+
+    def _replace_tree(self, tree):
+        # Los contadores de ActStats siguen en el árbol nuevo
+        tree.rollout_stats = self.tree.rollout_stats
+        self.tree = tree
+
+    def enable_stats(self, log_every=0):
+        self.stats = ActStats(log_every)
+        self.tree.rollout_stats = self.stats.rollouts
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+        self.tree.rollout_stats = None
+
+    def search_report(self):
+        """Resumen de iteraciones por jugada, para dimensionar hardware."""
+        report = {"moves": len(self.search_log)}
+        if self.search_log:
+            iters = np.array([it for it, _ in self.search_log])
+            secs = np.array([sec for _, sec in self.search_log])
+            report.update({
+                "iterations_mean": float(iters.mean()),
+                "iterations_min": int(iters.min()),
+                "iterations_max": int(iters.max()),
+                "seconds_mean": float(secs.mean()),
+                "playouts_per_second": float(iters.sum() * self.tree.batch / max(secs.sum(), 1e-9)),
+            })
+        if self.solver_log:
+            nodes = np.array([st["nodes"] for st in self.solver_log])
+            secs = np.array([st["seconds"] for st in self.solver_log])
+            report.update({
+                "solver_searches": len(nodes),
+                "solver_depth_mean": float(np.mean([st["depth"] for st in self.solver_log])),
+                "solver_nodes": int(nodes.sum()),
+                "solver_nodes_per_second": float(nodes.sum() / max(secs.sum(), 1e-9)),
+            })
+        return report
 
     # POLICY FINAL = Q + tácticas + MCTS fuerte
 
     def act(self, board: np.ndarray) -> int:
+        if self.stats is None:
+            return self._act(board)
+        return self._act_instrumented(board)
+
+    def _act_instrumented(self, board):
+        stats = self.stats
+        searches, solves = len(self.search_log), len(self.solver_log)
 
-        reds = np.sum(board == -1)
-        yellows = np.sum(board == 1)
-        player = -1 if reds == yellows else 1
+        start = time.perf_counter()
+        move = self._act(board)
+        elapsed = time.perf_counter() - start
 
-        legal = [c for c in range(7) if board[0, c] == 0]
-        state = self.encode(board)
+        stage = self.last_stage
+        stats.moves += 1
+        stats.stage_moves[stage] += 1
+        stats.stage_seconds[stage] += elapsed
+
+        # Lo que se consultó antes de la etapa que decidió, falló
+        stones = int(np.count_nonzero(board))
+        lookups = stats.lookups
+        if stage == "book":
+            lookups["book_hits"] += 1
+        elif stage != "tactics" and stones <= self.book.plies:
+            lookups["book_misses"] += 1
+        if stage == "qtable":
+            lookups["qtable_hits"] += 1
+        elif stage == "search":
+            lookups["qtable_misses"] += 1
+        if self.endgame_result == "tablebase":
+            lookups["tablebase_hits"] += 1
+        elif self.endgame_result is not None:
+            lookups["tablebase_misses"] += 1
+
+        search = stats.search
+        if len(self.search_log) > searches:
+            iterations = self.search_log[-1][0]
+            search["mcts_moves"] += 1
+            search["mcts_iterations"] += iterations
+            search["mcts_iterations_max"] = max(search["mcts_iterations_max"], iterations)
+        if len(self.solver_log) > solves:
+            search["solver_moves"] += 1
+            search["solver_nodes"] += sum(s["nodes"] for s in self.solver_log[solves:])
+
+        if stats.log_every and stats.moves % stats.log_every == 0:
+            print(stats.log_line())
+        return move
+
+    def _act(self, board):
+
+        deadline = None
+        if self.time_out is not None:
+            deadline = time.perf_counter() + self.time_out * (1 - self.TIME_MARGIN)
+
+        red, yellow, heights = board_to_bitboards(board)
+        player = -1 if sum(heights) % 2 == 0 else 1
+
+        legal = legal_moves(heights)
+        state, mirrored = canonical_key(position_key(red, yellow))
+        self.endgame_result = None
 
         # 1. Win/Block
-        tact = self.immediate_tactics(board, player, legal)
+        tact = self.immediate_tactics(red, yellow, heights, player, legal)
         if tact is not None:
+            self.last_stage = "tactics"
             return tact
 
-        # 2. Si el estado está en la Q-table → greedy
-        q_candidates = [(self.Q[(state, a)], a) for a in legal if (state, a) in self.Q]
+        # 2. Aperturas: jugada demostrada del libro
+        if sum(heights) <= self.book.plies:
+            move = self.book.lookup(state)
+            if move is not None:
+                self.last_stage = "book"
+                return COLS - 1 - move if mirrored else move
+
+        # 3. Finales: resultado exacto (tablebase o Solver); si no se
+        # resuelve dentro del tope se sigue con la Q-table o la búsqueda
+        if ROWS * COLS - sum(heights) <= self.ENDGAME_EMPTY:
+            move = self.endgame(red, yellow, heights, player, state, mirrored, deadline)
+            if move is not None:
+                self.last_stage = "endgame"
+                return move
+
+        # 4. Si el estado está en la Q-table → greedy
+        known = self.table.lookup(state)
+        q_candidates = []
+        if known is not None:
+            q, n = known
+            if mirrored:
+                q, n = q[::-1], n[::-1]
+            q_candidates = [(q[a], a) for a in legal if n[a] > 0]
         if q_candidates:
+            self.last_stage = "qtable"
             return max(q_candidates)[1]
 
-        # 3. Si no está en memoria → usar MCTS fuerte
-        return self.mcts(board, player, legal)
+        # Aperturas que la Q-table no conoce: jugada sin demostrar del libro
+        if sum(heights) <= self.book.plies:
+            move = self.book.lookup(state, unproven=True)
+            if move is not None:
+                self.last_stage = "book"
+                return COLS - 1 - move if mirrored else move
+
+        # 5. Si no está en memoria → buscar
+        self.last_stage = "search"
+        if self.engine == "mcts":
+            return self.mcts(red, yellow, heights, player, legal, deadline)
+        return self.alphabeta(red, yellow, heights, player, legal, deadline)
 
     # ---------------------------------------
     # TÁCTICAS INMEDIATAS
     # ---------------------------------------
 
-    def immediate_tactics(self, b, player, legal):
+    @staticmethod
+    def immediate_tactics(red, yellow, heights, player, legal):
 
-        def apply_move(board, col, p):
-            newb = board.copy()
-            for r in range(5, -1, -1):
-                if newb[r, col] == 0:
-                    newb[r, col] = p
-                    break
-            return newb
-
-        def winner(bb):
-            # Horizontal
-            for r in range(6):
-                for c in range(4):
-                    line = bb[r, c:c+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-            # Vertical
-            for c in range(7):
-                col = bb[:, c]
-                for r in range(3):
-                    line = col[r:r+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-            # Diag derecha
-            for r in range(3):
-                for c in range(4):
-                    diag = np.array([bb[r+i,c+i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-            # Diag izquierda
-            for r in range(3):
-                for c in range(3,7):
-                    diag = np.array([bb[r+i,c-i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-            return 0
+        mine, opp = (red, yellow) if player == -1 else (yellow, red)
 
         # Win
         for m in legal:
-            if winner(apply_move(b, m, player)) == player:
+            idx = move_index(heights, m)
+            if last_move_wins(mine | (1 << idx), idx):
                 return m
 
         # Block
-        opp = -player
         for m in legal:
-            if winner(apply_move(b, m, opp)) == opp:
+            idx = move_index(heights, m)
+            if last_move_wins(opp | (1 << idx), idx):
                 return m
 
         return None
 
-    # MCTS FUERTE (ORIGINAL)
+    # FINALES EXACTOS
 
-    def mcts(self, board, player, legal):
-        ITER = 50
-        C = 1.41
+    def endgame(self, red, yellow, heights, player, state, mirrored, deadline=None):
+        # La tablebase guarda la jugada en la orientación canónica
+        known = self.tablebase.lookup(state)
+        if known is not None:
+            self.endgame_result = "tablebase"
+            return COLS - 1 - known[0] if mirrored else known[0]
 
-        def apply_move(b, col, p):
-            newb = b.copy()
-            for r in range(5, -1, -1):
-                if newb[r, col] == 0:
-                    newb[r, col] = p
-                    break
-            return newb
-
-        def winner(b):
-            # Horizontal
-            for r in range(6):
-                for c in range(4):
-                    line = b[r, c:c+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-            # Vertical
-            for c in range(7):
-                col = b[:, c]
-                for r in range(3):
-                    line = col[r:r+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-            # Diag derecha
-            for r in range(3):
-                for c in range(4):
-                    diag = np.array([b[r+i, c+i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-            # Diag izquierda
-            for r in range(3):
-                for c in range(3,7):
-                    diag = np.array([b[r+i, c-i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            if np.all(b[0] != 0):
-                return 2
-            return 0
+        # Sin time_out el trabajo por jugada se acota con ENDGAME_NODES
+        max_nodes = self.ENDGAME_NODES if deadline is None else None
+        move, score = self.solver.search(red, yellow, heights, player,
+                                         deadline=deadline, max_nodes=max_nodes)
+        self.solver_log.append(self.solver.last_stats)
+
+        # Exacto si demostró un resultado o llegó hasta llenar el tablero
+        if score != 0 or self.solver.last_stats["depth"] == ROWS * COLS - sum(heights):
+            self.endgame_result = "solved"
+            self.tablebase.store(state, COLS - 1 - move if mirrored else move, score)
+            return move
+        self.endgame_result = "unsolved"
+        # Con time_out ya se gastó el tiempo: se juega la mejor jugada; sin
+        # él, None y act() sigue con la Q-table o la búsqueda
+        return move if deadline is not None else None
+
+    # ALPHA-BETA (solo o como filtro antes del MCTS)
+
+    def alphabeta(self, red, yellow, heights, player, legal, deadline=None):
+        solver_deadline = deadline
+        if deadline is not None and self.engine == "hybrid":
+            remaining = max(deadline - time.perf_counter(), 0.0)
+            solver_deadline = time.perf_counter() + remaining * self.SOLVER_SHARE
+        max_depth = self.SOLVER_DEPTH if deadline is None else None
+
+        move, score = self.solver.search(
+            red, yellow, heights, player, max_depth, solver_deadline
+        )
+        self.solver_log.append(self.solver.last_stats)
+
+        if self.engine == "alphabeta" or score != 0:
+            return move
+
+        # hybrid sin resultado demostrado: MCTS sin las jugadas perdedoras
+        safe = [m for m in legal if self.solver.root_scores.get(m, 0) >= 0]
+        return self.mcts(red, yellow, heights, player, safe or legal, deadline)
 
-        def rollout(b, p):
-            current = p
-            bb = b.copy()
-            while True:
-                w = winner(bb)
-                if w != 0:
-                    return w
-                legal2 = [c for c in range(7) if bb[0, c] == 0]
-                mv = np.random.choice(legal2)
-                bb = apply_move(bb, mv, current)
-                current = -current
-
-        # ----------- UCB --------------
-        def select_ucb(moves, wins, plays):
-            total = sum(plays[m] for m in moves) + 1e-9
-            best_score = -1
-            best_move = moves[0]
-            for m in moves:
-                if plays[m] == 0:
-                    return m
-                exploit = wins[m] / plays[m]
-                explore = C * np.sqrt(np.log(total) / plays[m])
-                if exploit + explore > best_score:
-                    best_score = exploit + explore
-                    best_move = m
-            return best_move
-
-        # ----------- MCTS MAIN LOOP --------------
-
-        wins = {m: 0 for m in legal}
-        plays = {m: 0 for m in legal}
-
-        for _ in range(ITER):
-            move = select_ucb(legal, wins, plays)
-            b2 = apply_move(board, move, player)
-            reward = rollout(b2, -player)
-
-            plays[move] += 1
-            if reward == player:
-                wins[move] += 1
-            elif reward == 2:
-                wins[move] += 0.5
+    # MCTS FUERTE (árbol completo, reutilizado entre jugadas)
+
+    def mcts(self, red, yellow, heights, player, legal, deadline=None):
+        # Con deadline: búsqueda anytime hasta el margen de seguridad
+        iterations = self.ITER if deadline is None else None
+
+        start = time.perf_counter()
+        if self.pool is not None and self.parallel == "root":
+            stats, done = self.root_parallel_search(
+                red, yellow, heights, player, iterations, deadline
+            )
+        else:
+            stats = self.tree.search(red, yellow, heights, player, iterations, deadline)
+            done = self.tree.last_iterations
+        self.search_log.append((done, time.perf_counter() - start))
 
         # robust child
-        return max(legal, key=lambda m: plays[m])
+        return max(legal, key=lambda m: stats[m][1])
+
+    def root_parallel_search(self, red, yellow, heights, player, iterations, deadline):
+        """Búsqueda en la raíz en todos los workers; suma sus estadísticas."""
+        budget = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+        counters = self.tree.rollout_stats
+        job = (red, yellow, heights, player, iterations, budget, counters is not None)
+        pending = self.pool.map_async(_root_search, [job] * self.workers)
+
+        # Este proceso también busca mientras esperan los workers
+        stats = self.tree.search(red, yellow, heights, player, iterations, deadline)
+        total_iterations = self.tree.last_iterations
+
+        merged = {m: list(wp) for m, wp in stats.items()}
+        for worker_stats, worker_iterations, worker_rollouts in pending.get():
+            total_iterations += worker_iterations
+            if counters is not None:
+                counters["rollouts"] += worker_rollouts["rollouts"]
+                counters["rollout_plies"] += worker_rollouts["rollout_plies"]
+            for m, (w, p) in worker_stats.items():
+                merged[m][0] += w
+                merged[m][1] += p
+
+        return {m: tuple(wp) for m, wp in merged.items()}, total_iterations
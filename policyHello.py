@@ -1,5 +1,6 @@
 import numpy as np
 from connect4.policy import Policy
+from policy import board_to_bitboards, last_move_wins, legal_moves, move_index
 
 
 class HelloPolicy(Policy):
@@ -9,72 +10,30 @@ class HelloPolicy(Policy):
 
     def act(self, board: np.ndarray) -> int:
 
-        def get_legal(b):
-            return [c for c in range(7) if b[0, c] == 0]
-
-        def apply_move(b, col, player):
-            bb = b.copy()
-            for r in range(5, -1, -1):
-                if bb[r, col] == 0:
-                    bb[r, col] = player
-                    break
-            return bb
-
-        def winner_global(b):
-            # Horizontal
-            for r in range(6):
-                for c in range(4):
-                    line = b[r, c:c+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-
-            # Vertical
-            for c in range(7):
-                col = b[:, c]
-                for r in range(3):
-                    line = col[r:r+4]
-                    if np.all(line == 1): return 1
-                    if np.all(line == -1): return -1
-
-            # Diagonal derecha
-            for r in range(3):
-                for c in range(4):
-                    diag = np.array([b[r+i, c+i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            # Diagonal izquierda
-            for r in range(3):
-                for c in range(3, 7):
-                    diag = np.array([b[r+i, c-i] for i in range(4)])
-                    if np.all(diag == 1): return 1
-                    if np.all(diag == -1): return -1
-
-            if np.all(b[0] != 0):
-                return 2
-            return 0
+        red, yellow, heights = board_to_bitboards(board)
 
         # -----------------------------
         # Comportamiento DEFENSIVO
         # -----------------------------
-        legal = get_legal(board)
+        legal = legal_moves(heights)
 
         # Determinar jugador oponente
-        reds = np.sum(board == -1)
-        yellows = np.sum(board == 1)
-        opponent_player = -1 if reds == yellows else 1
-        agent_player = -opponent_player
+        opponent_player = -1 if sum(heights) % 2 == 0 else 1
+        if opponent_player == -1:
+            opponent_mask, agent_mask = red, yellow
+        else:
+            opponent_mask, agent_mask = yellow, red
 
         # Si el OPONENTE puede ganar → bloquear
         for m in legal:
-            bb = apply_move(board, m, opponent_player)
-            if winner_global(bb) == opponent_player:
+            idx = move_index(heights, m)
+            if last_move_wins(opponent_mask | (1 << idx), idx):
                 return m
 
         #  Si YO puedo ganar → jugarlo (ataque simple)
         for m in legal:
-            bb = apply_move(board, m, agent_player)
-            if winner_global(bb) == agent_player:
+            idx = move_index(heights, m)
+            if last_move_wins(agent_mask | (1 << idx), idx):
                 return m
 
         # Nada crítico → random
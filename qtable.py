@@ -0,0 +1,297 @@
+import numpy as np
+
+from policy import COLS, PackedQTable, decode_state, encode_states
+
+
+class QTable:
+    """
+    Q/N de entrenamiento por estado: cada estado ocupa una fila con un
+    vector de 7 Q y otro de 7 N, así act() hace una sola consulta y learn()
+    actualiza la fila en su sitio.
+    """
+
+    def __init__(self, capacity=1024):
+        self.clear(capacity)
+
+    def clear(self, capacity=1024):
+        self.index = {}    # estado -> fila
+        self.states = []   # fila -> estado
+        self.q = np.zeros((capacity, COLS))
+        self.n = np.zeros((capacity, COLS), dtype=np.uint32)
+        self.dirty = set()  # filas cambiadas desde el último checkpoint
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, state):
+        return state in self.index
+
+    def entries(self):
+        """Número de pares (estado, acción) visitados."""
+        return int(np.count_nonzero(self.n[:len(self.states)]))
+
+    def get(self, state):
+        """(vector Q, vector N) del estado, o None si nunca se visitó."""
+        row = self.index.get(state)
+        if row is None:
+            return None
+        return self.q[row], self.n[row]
+
+    def _row(self, state):
+        row = self.index.get(state)
+        if row is None:
+            row = len(self.states)
+            if row == len(self.q):
+                self.q = np.concatenate([self.q, np.zeros_like(self.q)])
+                self.n = np.concatenate([self.n, np.zeros_like(self.n)])
+            self.index[state] = row
+            self.states.append(state)
+        return row
+
+    def add_return(self, state, action, G):
+        """Media incremental de FVMC: Q += (G - Q) / N."""
+        row = self._row(state)
+        self.n[row, action] += 1
+        self.q[row, action] += (G - self.q[row, action]) / self.n[row, action]
+        self.dirty.add(row)
+
+    # ------------------------------
+    # Deltas para el entrenamiento en paralelo
+    # ------------------------------
+
+    def copy(self):
+        table = QTable(capacity=1)
+        table.index = dict(self.index)
+        table.states = list(self.states)
+        table.q = self.q.copy()
+        table.n = self.n.copy()
+        return table
+
+    def delta(self, base):
+        """
+        Lo aprendido desde base (una copia anterior de esta tabla):
+        (estados, suma de retornos, número de retornos) por acción.
+        Como Q es la media de los retornos, la suma es Q*N - Q0*N0.
+        """
+        size = len(self.states)
+        n = self.n[:size].astype(np.int64)
+        # Filas de base por estado (una BoundedQTable pudo reordenarlas)
+        base_rows = np.array([base.index.get(s, -1) for s in self.states], dtype=np.int64)
+        known = base_rows >= 0
+        n0 = np.zeros_like(n)
+        q0 = np.zeros((size, COLS))
+        n0[known] = base.n[base_rows[known]]
+        q0[known] = base.q[base_rows[known]]
+        # Un estado desalojado después de la copia y vuelto a crear solo
+        # aporta lo nuevo: su fila actual ya no parte de la de base
+        evicted = getattr(self, "evicted_keys", ())
+        reset = np.array([s in evicted for s in self.states], dtype=bool)
+        n0[reset] = 0
+        q0[reset] = 0
+        counts = n - n0
+        sums = self.q[:size] * n - q0 * n0
+        rows = np.flatnonzero(counts.any(axis=1))
+        return [self.states[r] for r in rows], sums[rows], counts[rows]
+
+    def merge_delta(self, states, sums, counts):
+        """Suma un delta con medias ponderadas por N: igual que add_return()."""
+        rows = np.array([self._row(s) for s in states], dtype=np.int64)
+        if len(rows) == 0:
+            return
+        n_old = self.n[rows].astype(np.float64)
+        total = n_old + counts
+        visited = counts > 0
+        merged = (self.q[rows] * n_old + sums) / np.where(visited, total, 1)
+        self.q[rows] = np.where(visited, merged, self.q[rows])
+        self.n[rows] += counts.astype(np.uint32)
+        self.dirty.update(rows.tolist())
+
+    def update_rows(self, packed):
+        """Sustituye Q/N de los estados de packed (p. ej. un delta de checkpoint)."""
+        q, n = packed.to_dense()
+        rows = np.array([self._row(decode_state(k)) for k in packed.keys], dtype=np.int64)
+        if len(rows):
+            self.q[rows] = q
+            self.n[rows] = n
+            self.dirty.update(rows.tolist())
+
+    # ------------------------------
+    # Checkpoints incrementales
+    # ------------------------------
+
+    def dirty_packed(self):
+        """Solo las filas cambiadas desde mark_clean(), en formato .bin."""
+        rows = np.array(sorted(self.dirty), dtype=np.int64)
+        return PackedQTable.from_dense(
+            encode_states([self.states[r] for r in rows]), self.q[rows], self.n[rows]
+        )
+
+    def mark_clean(self):
+        self.dirty = set()
+
+    # ------------------------------
+    # Conversión a/desde el formato .bin
+    # ------------------------------
+
+    def to_packed(self):
+        size = len(self.states)
+        return PackedQTable.from_dense(
+            encode_states(self.states), self.q[:size], self.n[:size]
+        )
+
+    def update_from_packed(self, packed):
+        if packed.has_sha1_keys():
+            raise ValueError("Q-table con claves SHA1: migrarla con migrate_qtable_keys.py")
+        size = len(packed)
+        self.clear(max(size, 1024))
+        self.q[:size], self.n[:size] = packed.to_dense()
+        self.states = [decode_state(k) for k in packed.keys]
+        self.index = {s: row for row, s in enumerate(self.states)}
+
+    def save(self, path):
+        self.to_packed().save(path)
+
+    def load(self, path):
+        self.update_from_packed(PackedQTable.load(path))
+
+
+class BoundedQTable(QTable):
+    """
+    QTable con un máximo de max_states estados. Al llenarse desaloja de
+    golpe evict_batch estados: primero los que clean.py borraría (ninguna
+    acción con N >= min_n), luego los de menos visitas y, a igualdad, los
+    que llevan más tiempo sin consultarse ni actualizarse.
+    """
+
+    def __init__(self, max_states, min_n=2, evict_batch=None):
+        self.max_states = max_states
+        self.min_n = min_n
+        self.evict_batch = evict_batch or max(1, max_states // 10)
+        self.clock = 0
+        self.bulk = False   # durante merge_delta/update_rows no se desaloja
+        self.evicted = False   # hubo desalojos desde mark_clean()
+        self.evicted_keys = set()   # estados desalojados desde copy()
+        self.evictions = {"batches": 0, "states": 0, "visits": 0, "low_n_states": 0}
+        super().__init__(capacity=max_states)
+
+    def clear(self, capacity=1024):
+        super().clear(capacity)
+        self.touched = np.zeros(capacity, dtype=np.int64)   # fila -> último uso
+
+    def eviction_stats(self):
+        return dict(
+            self.evictions,
+            size=len(self),
+            max_states=self.max_states,
+            visits_kept=int(self.n[:len(self)].sum()),
+        )
+
+    def _evict(self, count, keep=()):
+        size = len(self.states)
+        n = self.n[:size]
+        visits = n.sum(axis=1)
+        low = n.max(axis=1) < self.min_n
+        age = self.clock - self.touched[:size]
+        # lexsort ordena por la última clave: low, visitas, antigüedad
+        order = np.lexsort((-age, visits, ~low))
+        protected = {self.index[s] for s in keep if s in self.index}
+        victims = [r for r in order[:count + len(protected)] if r not in protected][:count]
+        if not victims:
+            return
+
+        self.evicted = True
+        self.evicted_keys.update(self.states[r] for r in victims)
+        self.evictions["batches"] += 1
+        self.evictions["states"] += len(victims)
+        self.evictions["visits"] += int(visits[victims].sum())
+        self.evictions["low_n_states"] += int(low[victims].sum())
+
+        # Compactar: las filas que quedan pasan al principio
+        alive = np.ones(size, dtype=bool)
+        alive[victims] = False
+        kept = np.flatnonzero(alive)
+        new_size = len(kept)
+        self.q[:new_size] = self.q[kept]
+        self.n[:new_size] = self.n[kept]
+        self.touched[:new_size] = self.touched[kept]
+        self.q[new_size:size] = 0
+        self.n[new_size:size] = 0
+        remap = np.full(size, -1, dtype=np.int64)
+        remap[kept] = np.arange(new_size)
+        self.states = [self.states[r] for r in kept]
+        self.index = {s: row for row, s in enumerate(self.states)}
+        self.dirty = {int(remap[r]) for r in self.dirty if remap[r] >= 0}
+
+    def _shrink(self, keep=()):
+        """
+        Vuelve a max_states después de una escritura en bloque, sin
+        desalojar estados de keep mientras haya otros; si el bloque solo
+        ya no cabe, también salen algunos suyos.
+        """
+        excess = len(self.states) - self.max_states
+        if excess <= 0:
+            return
+        self._evict(max(excess, self.evict_batch), keep=keep)
+        if len(self.states) > self.max_states:
+            self._evict(len(self.states) - self.max_states)
+
+    def _row(self, state):
+        if (not self.bulk and state not in self.index
+                and len(self.states) >= self.max_states):
+            self._evict(self.evict_batch)
+        row = super()._row(state)
+        if len(self.touched) < len(self.q):
+            self.touched = np.concatenate(
+                [self.touched, np.zeros(len(self.q) - len(self.touched), dtype=np.int64)]
+            )
+        self.touched[row] = self.clock
+        return row
+
+    def copy(self):
+        # La copia es la base de delta(): los desalojos se cuentan desde aquí
+        self.evicted_keys = set()
+        return super().copy()
+
+    def mark_clean(self):
+        super().mark_clean()
+        self.evicted = False
+
+    def get(self, state):
+        self.clock += 1
+        row = self.index.get(state)
+        if row is None:
+            return None
+        self.touched[row] = self.clock
+        return self.q[row], self.n[row]
+
+    def add_return(self, state, action, G):
+        self.clock += 1
+        super().add_return(state, action, G)
+
+    # En bloque las filas se resuelven todas antes de escribir: desalojar a
+    # mitad compactaría la tabla y las filas ya resueltas apuntarían a
+    # otros estados. La tabla se pasa de max_states un momento y después
+    # se recorta.
+
+    def merge_delta(self, states, sums, counts):
+        self.clock += 1
+        self.bulk = True
+        try:
+            super().merge_delta(states, sums, counts)
+        finally:
+            self.bulk = False
+        self._shrink(keep=states)
+
+    def update_rows(self, packed):
+        self.clock += 1
+        self.bulk = True
+        try:
+            super().update_rows(packed)
+        finally:
+            self.bulk = False
+        self._shrink(keep=[decode_state(k) for k in packed.keys])
+
+    def update_from_packed(self, packed):
+        super().update_from_packed(packed)
+        if len(self.states) > self.max_states:
+            self._evict(len(self.states) - self.max_states)
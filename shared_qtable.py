@@ -0,0 +1,215 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from policy import (
+    COLS, FIB_HASH, U64_MASK, PackedQTable, decode_state, encode_states,
+)
+
+# Candados de cada tabla por nombre del bloque de memoria. Un Lock de
+# multiprocessing solo pasa a otro proceso al crearlo (herencia), así que
+# los workers los reciben con attach_locks() como initializer del Pool.
+_LOCKS = {}
+
+MAX_LOAD = 0.9   # ocupación máxima antes de dar error
+
+
+def attach_locks(locks):
+    """Initializer del Pool: locks = {nombre: (candado de alta, franjas)}."""
+    _LOCKS.update(locks)
+
+
+class SharedQTable:
+    """
+    Misma interfaz que QTable (get, add_return, save, load), pero las filas
+    viven en un bloque de multiprocessing.shared_memory: varios procesos
+    llaman a learn() sobre la misma tabla sin copiarla ni juntar deltas.
+
+    Tabla hash con direccionamiento abierto (sondeo lineal):
+      claves  capacidad uint64 (position_key canónica, 0 = libre)
+      Q       capacidad x 7 float64
+      N       capacidad x 7 uint32
+      tamaño  1 uint64 con el número de estados
+      sucias  capacidad uint8 (1 = cambió desde el último checkpoint)
+    Dar de alta un estado usa un candado global (pasa pocas veces); cada
+    actualización de Q/N usa el candado de la franja de su ranura y marca
+    la ranura como sucia. Las lecturas de get() no bloquean.
+    """
+
+    shared = True
+
+    def __init__(self, capacity=1 << 18, stripes=64, name=None):
+        slots = 1
+        while slots < capacity:
+            slots *= 2
+        self.capacity = slots
+        self.stripes = stripes
+        self._owner = name is None
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=name is None, size=self._nbytes(slots)
+        )
+        self.name = self.shm.name
+        self._views()
+        if self._owner:
+            # El bloque nuevo ya viene a ceros: todas las ranuras libres
+            _LOCKS[self.name] = (mp.Lock(), [mp.Lock() for _ in range(stripes)])
+
+    @staticmethod
+    def _nbytes(slots):
+        return slots * (8 + COLS * 8 + COLS * 4 + 1) + 8
+
+    def _views(self):
+        buf, slots = self.shm.buf, self.capacity
+        offset = 0
+        self.keys = np.frombuffer(buf, dtype=np.uint64, count=slots, offset=offset)
+        offset += self.keys.nbytes
+        self.q = np.frombuffer(buf, dtype=np.float64, count=slots * COLS,
+                               offset=offset).reshape(slots, COLS)
+        offset += self.q.nbytes
+        self.n = np.frombuffer(buf, dtype=np.uint32, count=slots * COLS,
+                               offset=offset).reshape(slots, COLS)
+        offset += self.n.nbytes
+        self._size = np.frombuffer(buf, dtype=np.uint64, count=1, offset=offset)
+        offset += self._size.nbytes
+        self.dirty = np.frombuffer(buf, dtype=np.uint8, count=slots, offset=offset)
+
+    # En los workers la tabla viaja solo por nombre y se vuelve a mapear
+    def __getstate__(self):
+        return {"name": self.name, "capacity": self.capacity, "stripes": self.stripes}
+
+    def __setstate__(self, state):
+        self.capacity = state["capacity"]
+        self.stripes = state["stripes"]
+        self._owner = False
+        self.shm = shared_memory.SharedMemory(name=state["name"])
+        self.name = self.shm.name
+        self._views()
+
+    def locks(self):
+        """{nombre: candados} para pasarlo a attach_locks() en los workers."""
+        return {self.name: _LOCKS[self.name]}
+
+    def _release(self):
+        # Las vistas numpy deben soltarse antes de cerrar el bloque
+        if hasattr(self, "keys"):
+            del self.keys, self.q, self.n, self._size, self.dirty
+            self.shm.close()
+
+    def close(self):
+        """Cierra la tabla; el proceso que la creó también libera el bloque."""
+        self._release()
+        if self._owner:
+            self.shm.unlink()
+            _LOCKS.pop(self.name, None)
+            self._owner = False
+
+    def __del__(self):
+        # Copias de los workers: solo se desmapean, el bloque sigue vivo
+        self._release()
+
+    def __len__(self):
+        return int(self._size[0])
+
+    def __contains__(self, state):
+        return self._find(state) is not None
+
+    def entries(self):
+        """Número de pares (estado, acción) visitados."""
+        return int(np.count_nonzero(self.n))
+
+    def _slot(self, state):
+        return (((state * FIB_HASH) & U64_MASK) >> 32) & (self.capacity - 1)
+
+    def _find(self, state):
+        slot = self._slot(state)
+        while True:
+            key = int(self.keys[slot])
+            if key == state:
+                return slot
+            if key == 0:
+                return None
+            slot = (slot + 1) & (self.capacity - 1)
+
+    def _row(self, state):
+        slot = self._find(state)
+        if slot is not None:
+            return slot
+        insert_lock, _ = _LOCKS[self.name]
+        with insert_lock:
+            # Otro proceso pudo darlo de alta mientras esperábamos
+            slot = self._slot(state)
+            while True:
+                key = int(self.keys[slot])
+                if key == state:
+                    return slot
+                if key == 0:
+                    break
+                slot = (slot + 1) & (self.capacity - 1)
+            if len(self) + 1 > MAX_LOAD * self.capacity:
+                raise RuntimeError(f"SharedQTable llena ({len(self)} estados)")
+            self.keys[slot] = state
+            self._size[0] += 1
+        return slot
+
+    def get(self, state):
+        """(vector Q, vector N) del estado, o None si nunca se visitó."""
+        slot = self._find(state)
+        if slot is None:
+            return None
+        return self.q[slot], self.n[slot]
+
+    def add_return(self, state, action, G):
+        """Media incremental de FVMC: Q += (G - Q) / N."""
+        slot = self._row(state)
+        _, stripe_locks = _LOCKS[self.name]
+        with stripe_locks[slot % self.stripes]:
+            self.n[slot, action] += 1
+            self.q[slot, action] += (G - self.q[slot, action]) / self.n[slot, action]
+            self.dirty[slot] = 1
+
+    # ------------------------------
+    # Conversión a/desde el formato .bin
+    # ------------------------------
+
+    def to_packed(self):
+        slots = np.flatnonzero(self.keys)
+        return PackedQTable.from_dense(
+            encode_states(self.keys[slots].tolist()), self.q[slots], self.n[slots]
+        )
+
+    def update_from_packed(self, packed):
+        if packed.has_sha1_keys():
+            raise ValueError("Q-table con claves SHA1: migrarla con migrate_qtable_keys.py")
+        q, n = packed.to_dense()
+        _, stripe_locks = _LOCKS[self.name]
+        for key, q_row, n_row in zip(packed.keys, q, n):
+            slot = self._row(decode_state(key))
+            with stripe_locks[slot % self.stripes]:
+                self.q[slot] = q_row
+                self.n[slot] = n_row
+                self.dirty[slot] = 1
+
+    # Las filas de packed sustituyen a las de la tabla (deltas de checkpoint)
+    update_rows = update_from_packed
+
+    # ------------------------------
+    # Checkpoints incrementales
+    # ------------------------------
+
+    def dirty_packed(self):
+        """Solo las ranuras cambiadas desde mark_clean(), en formato .bin."""
+        slots = np.flatnonzero(self.dirty)
+        return PackedQTable.from_dense(
+            encode_states(self.keys[slots].tolist()), self.q[slots], self.n[slots]
+        )
+
+    def mark_clean(self):
+        # Se llama entre rondas, sin workers escribiendo: no hace falta candado
+        self.dirty[:] = 0
+
+    def save(self, path):
+        self.to_packed().save(path)
+
+    def load(self, path):
+        self.update_from_packed(PackedQTable.load(path))
@@ -0,0 +1,64 @@
+import os
+
+from checkpoint import Checkpointer
+from qtable import QTable
+from shared_qtable import SharedQTable
+
+
+def test_fresh_run_does_not_build_on_old_base(tmp_path):
+    old = QTable()
+    old.add_return(1, 0, 1.0)
+    Checkpointer(old, tmp_path).save({"round": 1})
+
+    # Corrida nueva (sin restore) en el mismo directorio
+    new = QTable()
+    new.add_return(2, 3, -1.0)
+    checkpoint = Checkpointer(new, tmp_path)
+    checkpoint.save({"round": 1})
+    assert checkpoint.manifest["deltas"] == []
+
+    restored = QTable()
+    assert Checkpointer(restored, tmp_path).restore() == {"round": 1}
+    assert 1 not in restored and 2 in restored
+
+
+def test_resumed_run_saves_deltas(tmp_path):
+    table = QTable()
+    table.add_return(1, 0, 1.0)
+    Checkpointer(table, tmp_path).save({"round": 1})
+
+    resumed = QTable()
+    checkpoint = Checkpointer(resumed, tmp_path)
+    checkpoint.restore()
+    resumed.add_return(2, 3, -1.0)
+    checkpoint.save({"round": 2})
+    assert len(checkpoint.manifest["deltas"]) == 1
+    assert sorted(os.listdir(tmp_path)) == ["base_000001.bin", "delta_000002.bin", "manifest.json"]
+
+    restored = QTable()
+    Checkpointer(restored, tmp_path).restore()
+    assert 1 in restored and 2 in restored
+
+
+def test_shared_table_saves_deltas(tmp_path):
+    table = SharedQTable(capacity=64)
+    try:
+        checkpoint = Checkpointer(table, tmp_path)
+        checkpoint.restore()
+        table.add_return(1, 0, 1.0)
+        checkpoint.save({"round": 1})
+        table.add_return(2, 3, -1.0)
+        checkpoint.save({"round": 2})
+        assert len(checkpoint.manifest["deltas"]) == 1
+        assert len(table.dirty_packed()) == 0
+    finally:
+        table.close()
+
+    restored = SharedQTable(capacity=64)
+    try:
+        assert Checkpointer(restored, tmp_path).restore() == {"round": 2}
+        assert 1 in restored and 2 in restored
+        q, n = (row.copy() for row in restored.get(2))
+        assert n[3] == 1 and q[3] == -1.0
+    finally:
+        restored.close()
@@ -0,0 +1,28 @@
+import os
+
+from policy import (
+    BOOK_UNPROVEN, COLS, OpeningBook, canonical_key, move_index, position_key,
+)
+
+BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+
+def test_book_covers_first_plies():
+    book = OpeningBook.open(BOOK)
+    assert book.plies >= 1
+    state, _ = canonical_key(position_key(0, 0))
+    assert book.lookup(state, unproven=True) is not None
+    heights = [0] * COLS
+    for m in range(COLS):
+        red = 1 << move_index(heights, m)
+        state, _ = canonical_key(position_key(red, 0))
+        assert book.lookup(state, unproven=True) is not None
+
+
+def test_unproven_moves_only_on_request():
+    book = OpeningBook.build({11: (3, 5), 22: (2, BOOK_UNPROVEN)}, plies=4)
+    assert book.lookup(11) == 3
+    assert book.lookup(22) is None
+    assert book.lookup(22, unproven=True) == 2
+    assert book.lookup(33, unproven=True) is None
+    assert len(book) == 2 and book.proven() == 1
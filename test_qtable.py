@@ -0,0 +1,74 @@
+import numpy as np
+
+from qtable import BoundedQTable, QTable
+
+
+def _delta(states, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, 5, size=(len(states), 7))
+    sums = rng.uniform(-1, 1, size=(len(states), 7)) * counts
+    return sums, counts
+
+
+def _check_rows(table, states, sums, counts):
+    """Cada estado que quedó en la tabla tiene su propio Q/N."""
+    for s, row_sums, row_counts in zip(states, sums, counts):
+        entry = table.get(s)
+        if entry is not None:
+            q, n = entry
+            assert (n == row_counts).all()
+            assert np.allclose(q, row_sums / row_counts)
+
+
+def test_bounded_merge_delta_larger_than_capacity():
+    table = BoundedQTable(50)
+    states = list(range(1, 200))
+    sums, counts = _delta(states)
+    table.merge_delta(states, sums, counts)
+    assert len(table) <= 50
+    _check_rows(table, states, sums, counts)
+
+
+def test_bounded_merge_delta_keeps_batch_when_it_fits():
+    table = BoundedQTable(50, evict_batch=5)
+    old = list(range(1000, 1045))
+    table.merge_delta(old, *_delta(old, seed=1))
+    states = list(range(1, 30))
+    sums, counts = _delta(states, seed=2)
+    table.merge_delta(states, sums, counts)
+    assert len(table) <= 50
+    assert all(s in table for s in states)
+    _check_rows(table, states, sums, counts)
+
+
+def test_bounded_update_rows_larger_than_capacity():
+    source = QTable()
+    states = list(range(1, 120))
+    sums, counts = _delta(states, seed=3)
+    source.merge_delta(states, sums, counts)
+    table = BoundedQTable(40)
+    table.update_rows(source.to_packed())
+    assert len(table) <= 40
+    _check_rows(table, states, sums, counts)
+
+
+def test_delta_of_evicted_and_recreated_state():
+    main = BoundedQTable(10)
+    main.add_return(1, 0, 1.0)
+    worker = BoundedQTable(2, evict_batch=1)
+    worker.update_from_packed(main.to_packed())
+
+    base = worker.copy()
+    worker.add_return(2, 0, 0.5)
+    worker.add_return(3, 0, 0.5)   # desaloja el estado 1
+    assert 1 not in worker
+    worker.add_return(1, 0, -1.0)
+    worker.add_return(1, 0, -1.0)  # vuelve con N mayor que en base
+
+    states, sums, counts = worker.delta(base)
+    row = states.index(1)
+    assert counts[row, 0] == 2 and np.isclose(sums[row, 0], -2.0)
+
+    main.merge_delta(states, sums, counts)
+    q, n = main.get(1)
+    assert n[0] == 3 and np.isclose(q[0], -1 / 3)
@@ -0,0 +1,311 @@
+import argparse
+import functools
+import json
+import math
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from policy import ALjuriRuiz
+from policyHello import HelloPolicy
+from training_env import play_game
+
+# Torneo de evaluación (sin learn()): todos contra todos, alternando
+# colores, en un pool de procesos. Cada emparejamiento se juega por lotes
+# y se corta en cuanto el SPRT decide entre H0 (diferencia <= elo0) y
+# H1 (diferencia >= elo1), o al llegar a max_games. Los agentes no se
+# mandan a los workers (tienen memory maps y archivos abiertos): se manda
+# una fábrica por nombre y cada proceso construye los suyos una sola vez.
+
+
+# ---------------------------------------
+# ELO Y SPRT
+# ---------------------------------------
+
+def score_to_elo(score):
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_stats(wins, draws, losses):
+    """Puntaje medio por partida y su varianza (trinomial)."""
+    games = wins + draws + losses
+    score = (wins + 0.5 * draws) / games
+    variance = (wins + 0.25 * draws) / games - score ** 2
+    # Sin varianza (todo victorias, p. ej.) se usa la de una partida de más
+    return score, max(variance, 0.25 / (games + 1))
+
+
+def elo_interval(wins, draws, losses, z=1.96):
+    """Diferencia de Elo y su intervalo (normal sobre el puntaje medio)."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, -math.inf, math.inf
+    score, variance = score_stats(wins, draws, losses)
+    half = z * math.sqrt(variance / games)
+    # Media partida de margen: con 100% o 0% el Elo sería infinito
+    eps = 0.5 / games
+    clip = lambda s: min(max(s, eps), 1 - eps)
+    return (score_to_elo(clip(score)), score_to_elo(clip(score - half)),
+            score_to_elo(clip(score + half)))
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio del SPRT con la aproximación normal (trinomial):
+    LLR = n (s1 - s0) (2 x - s0 - s1) / (2 var).
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score, variance = score_stats(wins, draws, losses)
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# ---------------------------------------
+# WORKERS
+# ---------------------------------------
+
+_FACTORIES = {}
+_AGENTS = {}
+
+
+def _init_worker(factories):
+    _FACTORIES.clear()
+    _FACTORIES.update(factories)
+    _AGENTS.clear()
+
+
+def _agent(name):
+    if name not in _AGENTS:
+        _AGENTS[name] = _FACTORIES[name]()
+    return _AGENTS[name]
+
+
+def _play_batch(args):
+    """
+    Worker: juega games partidas entre name_a y name_b alternando quién
+    empieza y devuelve (victorias, empates, derrotas) desde el lado de A.
+    """
+    pairing, name_a, name_b, games, seed = args
+    np.random.seed(seed)
+    a, b = _agent(name_a), _agent(name_b)
+
+    wins = draws = losses = 0
+    for g in range(games):
+        # Partidas pares: A con rojo (-1); impares: B con rojo
+        if g % 2 == 0:
+            winner = play_game(a, b, learn=False)
+            a_color = -1
+        else:
+            winner = play_game(b, a, learn=False)
+            a_color = 1
+        if winner == a_color:
+            wins += 1
+        elif winner == -a_color:
+            losses += 1
+        else:
+            draws += 1
+    return pairing, wins, draws, losses
+
+
+# ---------------------------------------
+# TORNEO
+# ---------------------------------------
+
+def ratings(names, results, iterations=200):
+    """
+    Elo de cada jugador a partir de todos los emparejamientos (modelo de
+    Bradley-Terry, empates como media partida), centrado en media 0.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    k = len(names)
+    score = np.zeros((k, k))
+    games = np.zeros((k, k))
+    for r in results:
+        i, j = index[r["a"]], index[r["b"]]
+        n = r["wins"] + r["draws"] + r["losses"]
+        score[i, j] += r["wins"] + 0.5 * r["draws"]
+        score[j, i] += r["losses"] + 0.5 * r["draws"]
+        games[i, j] += n
+        games[j, i] += n
+    # Media partida a favor y en contra de cada uno: nadie queda en ±infinito
+    score += 0.5 * (games > 0)
+    games += 1.0 * (games > 0)
+
+    strength = np.ones(k)
+    for _ in range(iterations):
+        denom = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        strength = np.where(denom > 0, score.sum(axis=1) / np.maximum(denom, 1e-12), strength)
+        strength /= np.exp(np.log(strength).mean())
+    elo = 400 * np.log10(strength)
+    return {name: float(elo[index[name]]) for name in names}
+
+
+def run_tournament(factories, max_games=400, batch=20, workers=0, elo0=0.0, elo1=50.0,
+                   alpha=0.05, beta=0.05, min_games=40, seed=0, log=print):
+    """
+    factories: {nombre: callable sin argumentos que crea el agente}
+    (clases o functools.partial, para que se puedan mandar a los workers).
+    Cada ronda reparte lotes de batch partidas entre los emparejamientos
+    que el SPRT aún no decidió, los suficientes para llenar el pool;
+    después de cada ronda se actualiza el LLR. Devuelve los resultados por
+    emparejamiento y el Elo de cada jugador.
+    """
+    batch += batch % 2   # par: cada lote alterna colores por igual
+    names = list(factories)
+    lower, upper = sprt_bounds(alpha, beta)
+    seeds = np.random.SeedSequence(seed)
+
+    pairings = []
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            pairings.append({"a": names[i], "b": names[j], "wins": 0, "draws": 0,
+                             "losses": 0, "llr": 0.0, "result": None})
+
+    start = time.perf_counter()
+    pool = mp.Pool(workers, initializer=_init_worker, initargs=(factories,)) if workers > 0 else None
+    if pool is None:
+        _init_worker(factories)
+    try:
+        rounds = 0
+        while True:
+            open_ = [p for p, r in enumerate(pairings) if r["result"] is None]
+            if not open_:
+                break
+            per_pairing = max(1, -(-max(workers, 1) // len(open_)))
+            jobs = []
+            for p in open_:
+                r = pairings[p]
+                played = r["wins"] + r["draws"] + r["losses"]
+                for _ in range(per_pairing):
+                    games = min(batch, max_games - played)
+                    if games <= 0:
+                        break
+                    played += games
+                    child = int(seeds.spawn(1)[0].generate_state(1)[0])
+                    jobs.append((p, r["a"], r["b"], games, child))
+
+            outcomes = pool.imap_unordered(_play_batch, jobs) if pool else map(_play_batch, jobs)
+            for p, wins, draws, losses in outcomes:
+                r = pairings[p]
+                r["wins"] += wins
+                r["draws"] += draws
+                r["losses"] += losses
+
+            rounds += 1
+            for p in open_:
+                r = pairings[p]
+                played = r["wins"] + r["draws"] + r["losses"]
+                r["llr"] = sprt_llr(r["wins"], r["draws"], r["losses"], elo0, elo1)
+                if played >= min_games and r["llr"] >= upper:
+                    r["result"] = "H1"
+                elif played >= min_games and r["llr"] <= lower:
+                    r["result"] = "H0"
+                elif played >= max_games:
+                    r["result"] = "max_games"
+                if log is not None:
+                    log(f"[INFO] Ronda {rounds}: {r['a']} vs {r['b']} "
+                        f"+{r['wins']} ={r['draws']} -{r['losses']} "
+                        f"LLR {r['llr']:.2f} [{lower:.2f}, {upper:.2f}]"
+                        + (f" -> {r['result']}" if r["result"] else ""))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    for r in pairings:
+        r["elo"], r["elo_low"], r["elo_high"] = elo_interval(r["wins"], r["draws"], r["losses"])
+        r["games"] = r["wins"] + r["draws"] + r["losses"]
+    seconds = time.perf_counter() - start
+    games = sum(r["games"] for r in pairings)
+    return {
+        "pairings": pairings,
+        "ratings": ratings(names, pairings),
+        "games": games,
+        "seconds": seconds,
+        "sprt": {"elo0": elo0, "elo1": elo1, "alpha": alpha, "beta": beta},
+    }
+
+
+# ---------------------------------------
+# CLI
+# ---------------------------------------
+
+def _value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return None if text == "None" else text
+
+
+def parse_agent(spec):
+    """
+    "nombre" -> ALjuriRuiz por defecto; "nombre:hello" -> HelloPolicy;
+    "nombre:clave=valor,..." -> ALjuriRuiz(clave=valor, ...).
+    """
+    name, _, options = spec.partition(":")
+    if options == "hello":
+        return name, HelloPolicy
+    kwargs = {}
+    for item in filter(None, options.split(",")):
+        key, _, value = item.partition("=")
+        kwargs[key] = _value(value)
+    return name, functools.partial(ALjuriRuiz, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Torneo todos contra todos sin aprendizaje, con Elo y corte por SPRT"
+    )
+    parser.add_argument("--agent", action="append", required=True,
+                        help="nombre[:hello | :clave=valor,...] (p. ej. "
+                             "nuevo:q_filename=Q_table_Nuevo.bin,engine=hybrid)")
+    parser.add_argument("--max-games", type=int, default=400, help="máximo por emparejamiento")
+    parser.add_argument("--batch", type=int, default=20, help="partidas por lote (par)")
+    parser.add_argument("--min-games", type=int, default=40, help="mínimo antes de que decida el SPRT")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=50.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON con los resultados")
+    args = parser.parse_args()
+
+    factories = dict(parse_agent(spec) for spec in args.agent)
+    if len(factories) < 2:
+        parser.error("hacen falta al menos dos agentes con nombres distintos")
+
+    result = run_tournament(factories, args.max_games, args.batch, args.workers,
+                            args.elo0, args.elo1, args.alpha, args.beta,
+                            args.min_games, args.seed)
+
+    print()
+    for r in result["pairings"]:
+        print(f"{r['a']} vs {r['b']}: +{r['wins']} ={r['draws']} -{r['losses']} "
+              f"({r['games']} partidas) Elo {r['elo']:+.0f} "
+              f"[{r['elo_low']:+.0f}, {r['elo_high']:+.0f}] SPRT {r['result']}")
+    print()
+    for name, elo in sorted(result["ratings"].items(), key=lambda kv: -kv[1]):
+        print(f"{name:>20}  {elo:+.0f}")
+    print(f"\n{result['games']} partidas en {result['seconds']:.1f} s")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
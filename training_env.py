@@ -1,13 +1,19 @@
 import numpy as np
 from connect4.connect_state import ConnectState
-
-def play_game(agentA, agentB):
-    """Juega una partida entre dos agentes y retorna el ganador."""
+from shared_qtable import attach_locks
+
+def play_game(agentA, agentB, log=None, ids=(0, 1), learn=True):
+    """
+    Juega una partida entre dos agentes y retorna el ganador. Si se pasa
+    log (un EpisodeLogWriter o una lista) se le añade
+    (jugadas, ganador, id de A, id de B). Con learn=False no se llama a
+    learn() (evaluación: los agentes pueden no tenerlo).
+    """
     agentA.mount()
     agentB.mount()
 
     state = ConnectState()
-    history = []
+    history = []   # columnas jugadas, en orden
 
     while not state.is_final():
         player = state.player
@@ -17,7 +23,7 @@ def play_game(agentA, agentB):
         else:
             action = agentB.act(state.board)
 
-        history.append((state.board.copy(), action))
+        history.append(int(action))
         state = state.transition(int(action))
 
     # Determinar ganador
@@ -35,20 +41,58 @@ def play_game(agentA, agentB):
         rewardB = 0
 
     # APRENDIZAJE AQUÍ
-    agentA.learn(rewardA)
-    agentB.learn(rewardB)
+    if learn:
+        agentA.learn(rewardA)
+        agentB.learn(rewardB)
+
+    if log is not None:
+        log.append((history, int(winner), ids[0], ids[1]))
 
     return winner
 
 
-def train_pair(args):
+def train_pair(args, log=None, ids=(0, 1)):
     agentA, agentB, episodes = args
 
     for _ in range(episodes):
-        play_game(agentA, agentB)
-
-
-def train_agents(agents, episodes_per_pair=200):
+        play_game(agentA, agentB, log, ids)
+
+
+def _train_shard(args):
+    """
+    Worker: juega un trozo de episodios con copias locales de los agentes
+    y devuelve solo lo aprendido, {índice de tabla: delta}, y las
+    partidas jugadas (para el log).
+    """
+    agentA, agentB, episodes, table_ids, ids = args
+
+    bases = {}
+    for agent, tid in zip((agentA, agentB), table_ids):
+        if tid is not None and tid not in bases:
+            bases[tid] = (agent.table, agent.table.copy())
+
+    games = []
+    train_pair((agentA, agentB, episodes), games, ids)
+
+    deltas = {tid: table.delta(base) for tid, (table, base) in bases.items()}
+    return deltas, games
+
+
+def train_agents(agents, episodes_per_pair=200, workers=0, sync_every=25, log=None,
+                 checkpoint=None, resume=False):
+    """
+    workers = 0: todos los pares en este proceso, uno tras otro.
+    workers > 0: cada par se parte en trozos de sync_every episodios; en
+    cada ronda los trozos de todos los pares se juegan en paralelo desde
+    la misma copia de las tablas y al final de la ronda sus deltas se
+    suman a las tablas compartidas (medias ponderadas por N). Las
+    SharedQTable no necesitan deltas: los workers escriben directamente.
+    log (EpisodeLogWriter opcional) recibe todas las partidas; el id de
+    cada agente es su posición en agents.
+    checkpoint (Checkpointer opcional) guarda la tabla cada cierto número
+    de partidas o segundos junto con el cursor (par y episodio, o ronda);
+    con resume=True se recarga el último checkpoint y se sigue desde ahí.
+    """
     import multiprocessing as mp
 
     tasks = []
@@ -56,16 +100,90 @@ def train_agents(agents, episodes_per_pair=200):
 
     for i in range(k):
         for j in range(i + 1, k):
-            tasks.append((agents[i], agents[j], episodes_per_pair))
-
-    print("\n=== ENTRENAMIENTO SECUENCIAL ===")
-    total = len(tasks)
-    count = 1
-
-    for t in tasks:
-        print(f"Entrenando par {count}/{total} ...")
-        train_pair(t)
-        count += 1
-
+            tasks.append((agents[i], agents[j], episodes_per_pair, (i, j)))
+
+    cursor = None
+    if checkpoint is not None and resume:
+        cursor = checkpoint.restore()
+        # El cursor depende del modo: par/episodio en secuencial, ronda en paralelo
+        expected = {"pair", "episode"} if workers <= 0 else {"round"}
+        if cursor is not None and set(cursor) != expected:
+            raise ValueError(
+                f"El checkpoint se guardó en modo {'paralelo' if 'round' in cursor else 'secuencial'} "
+                f"(cursor {cursor}); reanudar en el mismo modo (workers = 0 o > 0)"
+            )
+
+    def save_checkpoint(position):
+        # El log se vacía antes para que no quede detrás del checkpoint
+        if log is not None:
+            log.flush()
+        checkpoint.save(position)
+
+    if workers <= 0:
+        print("\n=== ENTRENAMIENTO SECUENCIAL ===")
+        total = len(tasks)
+        start_pair, start_episode = 0, 0
+        if cursor is not None:
+            start_pair, start_episode = cursor["pair"], cursor["episode"]
+
+        for count, (agentA, agentB, episodes, ids) in enumerate(tasks):
+            if count < start_pair:
+                continue
+            print(f"Entrenando par {count + 1}/{total} ...")
+            first = start_episode if count == start_pair else 0
+            for e in range(first, episodes):
+                play_game(agentA, agentB, log, ids)
+                if checkpoint is not None and checkpoint.due():
+                    save_checkpoint({"pair": count, "episode": e + 1})
+
+        if checkpoint is not None:
+            save_checkpoint({"pair": total, "episode": 0})
+        if log is not None:
+            log.flush()
+        print("Entrenamiento completado.")
+        return
+
+    # Tablas distintas (varios agentes pueden compartir la misma)
+    tables = []
+    locks = {}
+    for agent in agents:
+        table = getattr(agent, "table", None)
+        if table is None:
+            continue
+        if getattr(table, "shared", False):
+            locks.update(table.locks())
+        elif not any(table is t for t in tables):
+            tables.append(table)
+
+    def table_id(agent):
+        table = getattr(agent, "table", None)
+        for tid, t in enumerate(tables):
+            if table is t:
+                return tid
+        return None
+
+    print(f"\n=== ENTRENAMIENTO PARALELO ({workers} procesos) ===")
+    rounds = -(-episodes_per_pair // sync_every)
+    start_round = 0 if cursor is None else cursor["round"]
+
+    with mp.Pool(workers, initializer=attach_locks, initargs=(locks,)) as pool:
+        for r in range(start_round, rounds):
+            episodes = min(sync_every, episodes_per_pair - r * sync_every)
+            jobs = [
+                (a, b, episodes, (table_id(a), table_id(b)), ids)
+                for a, b, _, ids in tasks
+            ]
+            for deltas, games in pool.imap_unordered(_train_shard, jobs):
+                for tid, delta in deltas.items():
+                    tables[tid].merge_delta(*delta)
+                if log is not None:
+                    log.extend(games)
+            print(f"Ronda {r + 1}/{rounds}: {len(jobs) * episodes} partidas sincronizadas")
+            if checkpoint is not None and checkpoint.due(len(jobs) * episodes):
+                save_checkpoint({"round": r + 1})
+
+    if checkpoint is not None:
+        save_checkpoint({"round": rounds})
+    if log is not None:
+        log.flush()
     print("Entrenamiento completado.")
-
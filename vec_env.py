@@ -0,0 +1,247 @@
+import argparse
+import time
+
+import numpy as np
+
+from episode_log import EpisodeLogWriter
+from policy import (
+    BOTTOM, COLS, H1, ROWS, PackedQTable, bitboards_to_boards, canonical_keys_batch,
+    has_four_batch,
+)
+
+# N partidas a la vez como arrays de bitboards (mismo formato que policy.py:
+# bit = col * 7 + fila). step() juega una columna en cada partida, detecta
+# ganador o empate de todas juntas y, con auto_reset, vuelve a empezar las
+# que terminaron, así el lote siempre está lleno. Sin auto_reset las
+# terminadas quedan marcadas en done y step() ya no las toca. Las
+# políticas en lote reciben (rojo, amarillo, alturas, jugador, rng) de las
+# partidas que les tocan y devuelven una columna por partida.
+
+_U64_ONE = np.uint64(1)
+
+
+class VecConnectState:
+
+    def __init__(self, n, auto_reset=True, log=None, ids=(0, 1)):
+        self.n = n
+        self.auto_reset = auto_reset
+        self.log = log        # EpisodeLogWriter o lista: partidas terminadas
+        self.ids = ids        # ids de los agentes (rojo, amarillo) para el log
+        self.red = np.zeros(n, dtype=np.uint64)
+        self.yellow = np.zeros(n, dtype=np.uint64)
+        self.heights = np.zeros((n, COLS), dtype=np.int64)
+        self.player = np.full(n, -1, dtype=np.int64)
+        self.moves = np.zeros((n, ROWS * COLS), dtype=np.uint8)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)   # terminadas (sin auto_reset)
+        self.games = 0        # partidas terminadas desde que se creó
+
+    def reset(self, which=None):
+        """Vuelve al tablero vacío todas las partidas, o las de which (bool)."""
+        which = slice(None) if which is None else which
+        self.red[which] = 0
+        self.yellow[which] = 0
+        self.heights[which] = 0
+        self.player[which] = -1
+        self.length[which] = 0
+        self.done[which] = False
+
+    def legal_mask(self):
+        """(n, 7) bool: columnas con sitio en cada partida."""
+        return self.heights < ROWS
+
+    def keys(self):
+        """position_key() de cada partida."""
+        return self.red + (self.red | self.yellow) + np.uint64(BOTTOM)
+
+    def canonical_keys(self):
+        """(claves canónicas, reflejada) como canonical_key(), en lote."""
+        return canonical_keys_batch(self.red, self.yellow)
+
+    def boards(self):
+        """Tableros numpy (n, 6, 7), compatibles con Policy.act(board)."""
+        return bitboards_to_boards(self.red, self.yellow)
+
+    def step(self, actions):
+        """
+        Juega actions[i] en la partida i. Devuelve (ganador, terminada):
+        ganador -1 o 1, 2 si es empate y 0 si la partida sigue; terminada
+        solo marca las que acaban en esta jugada. Las terminadas van al log
+        y, con auto_reset, empiezan de nuevo; sin auto_reset, las que ya
+        habían terminado se saltan (su acción se ignora).
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        rows = np.flatnonzero(~self.done)
+        actions = actions[rows]
+        bad = (actions < 0) | (actions >= COLS)
+        bad[~bad] = self.heights[rows[~bad], actions[~bad]] >= ROWS
+        if bad.any():
+            raise ValueError(f"Jugada no permitida en las partidas {rows[bad][:10]}")
+
+        idx = actions * H1 + self.heights[rows, actions]
+        bit = _U64_ONE << idx.astype(np.uint64)
+        red, yellow, player = self.red[rows], self.yellow[rows], self.player[rows]
+        red_turn = player == -1
+        red = np.where(red_turn, red | bit, red)
+        yellow = np.where(red_turn, yellow, yellow | bit)
+        self.red[rows], self.yellow[rows] = red, yellow
+        self.heights[rows, actions] += 1
+        self.moves[rows, self.length[rows]] = actions
+        self.length[rows] += 1
+
+        # Solo puede haber ganado el que acaba de mover
+        won = has_four_batch(np.where(red_turn, red, yellow))
+        full = self.length[rows] == ROWS * COLS
+        winner = np.zeros(self.n, dtype=np.int64)
+        winner[rows] = np.where(won, player, np.where(full, 2, 0))
+        self.player[rows] = -player
+
+        done = winner != 0
+        if done.any():
+            finished = np.flatnonzero(done)
+            self.games += finished.size
+            if self.log is not None:
+                # En el log el empate es 0, como en play_game()
+                self.log.extend(
+                    (self.moves[g, :self.length[g]].tolist(),
+                     0 if winner[g] == 2 else int(winner[g]), self.ids[0], self.ids[1])
+                    for g in finished
+                )
+            if self.auto_reset:
+                self.reset(done)
+            else:
+                self.done |= done
+        return winner, done
+
+
+# ---------------------------------------
+# POLÍTICAS EN LOTE
+# ---------------------------------------
+
+def random_actions(red, yellow, heights, player, rng):
+    """Columna legal al azar en cada partida."""
+    noise = rng.random(heights.shape)
+    noise[heights >= ROWS] = -1.0
+    return noise.argmax(axis=1)
+
+
+def winning_moves(mask, heights):
+    """(m, 7) bool: columnas donde una ficha más completa 4 en línea de mask."""
+    wins = np.zeros(heights.shape, dtype=bool)
+    for c in range(COLS):
+        idx = (c * H1 + np.minimum(heights[:, c], ROWS)).astype(np.uint64)
+        wins[:, c] = has_four_batch(mask | (_U64_ONE << idx))
+    return wins & (heights < ROWS)
+
+
+def tactics(red, yellow, heights, player):
+    """
+    immediate_tactics() en lote: (columna, encontrada). Primero ganar,
+    luego bloquear; entre varias, la primera columna. Es lo que juega
+    HelloPolicy: su "opponent_mask" es en realidad la del jugador que
+    mueve, así que su primer bucle busca la victoria propia.
+    """
+    mine = np.where(player == -1, red, yellow)
+    opp = np.where(player == -1, yellow, red)
+    win = winning_moves(mine, heights)
+    block = winning_moves(opp, heights)
+    has_win = win.any(axis=1)
+    cols = np.where(has_win, win.argmax(axis=1), block.argmax(axis=1))
+    return cols, has_win | block.any(axis=1)
+
+
+def tactic_actions(red, yellow, heights, player, rng):
+    """HelloPolicy en lote: ganar o bloquear si se puede; si no, al azar."""
+    cols, found = tactics(red, yellow, heights, player)
+    return np.where(found, cols, random_actions(red, yellow, heights, player, rng))
+
+
+class QGreedy:
+    """
+    Política de act() sin búsqueda, en lote: tácticas, después la mejor
+    acción conocida de la Q-table y, si el estado no está, al azar.
+    table es una PackedQTable (una QTable se pasa con to_packed()).
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __call__(self, red, yellow, heights, player, rng):
+        cols, found = tactics(red, yellow, heights, player)
+
+        keys, flip = canonical_keys_batch(red, yellow)
+        q, n = self.table.lookup_batch(keys)
+        q = np.where(flip[:, None], q[:, ::-1], q)
+        n = np.where(flip[:, None], n[:, ::-1], n)
+
+        score = np.where((n > 0) & (heights < ROWS), q, -np.inf)
+        known = np.isfinite(score).any(axis=1)
+        # Empates a la columna mayor, como max() sobre (q, acción) en act()
+        greedy = COLS - 1 - score[:, ::-1].argmax(axis=1)
+
+        fallback = random_actions(red, yellow, heights, player, rng)
+        return np.where(found, cols, np.where(known, greedy, fallback))
+
+
+def play_batch(env, red_policy, yellow_policy, games, rng=None):
+    """
+    Juega con env hasta terminar games partidas (sin auto_reset, como
+    mucho una por entorno); cada política mueve en las partidas donde le
+    toca a su color. Devuelve {ganador: partidas} (-1, 1 y 2 = empate).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    results = {-1: 0, 1: 0, 2: 0}
+    target = env.games + games
+    actions = np.zeros(env.n, dtype=np.int64)
+    while env.games < target and not env.done.all():
+        for color, policy in ((-1, red_policy), (1, yellow_policy)):
+            rows = np.flatnonzero(env.player == color)
+            if rows.size:
+                actions[rows] = policy(env.red[rows], env.yellow[rows],
+                                       env.heights[rows], env.player[rows], rng)
+        winner, done = env.step(actions)
+        for w in (-1, 1, 2):
+            results[w] += int(np.count_nonzero(winner == w))
+    return results
+
+
+def _policy(name, table):
+    if name == "random":
+        return random_actions
+    if name == "tactics":
+        return tactic_actions
+    return QGreedy(PackedQTable.open(table))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Self-play en lote (VecConnectState); las partidas se guardan para offline_learner.py"
+    )
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--envs", type=int, default=1024, help="partidas simultáneas")
+    parser.add_argument("--red", choices=("random", "tactics", "qgreedy"), default="tactics")
+    parser.add_argument("--yellow", choices=("random", "tactics", "qgreedy"), default="tactics")
+    parser.add_argument("--table", default="Q_table_NuevoCleaned.bin", help="Q-table de qgreedy")
+    parser.add_argument("--log", default=None, help="log de partidas (episode_log.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    red, yellow = _policy(args.red, args.table), _policy(args.yellow, args.table)
+
+    start = time.perf_counter()
+    if args.log is None:
+        results = play_batch(VecConnectState(args.envs), red, yellow, args.games, rng)
+    else:
+        with EpisodeLogWriter(args.log) as log:
+            env = VecConnectState(args.envs, log=log)
+            results = play_batch(env, red, yellow, args.games, rng)
+    seconds = time.perf_counter() - start
+
+    total = sum(results.values())
+    print(f"Rojo {results[-1]} - Amarillo {results[1]} - Empates {results[2]}")
+    print(f"{total} partidas en {seconds:.1f} s ({total / max(seconds, 1e-9):.0f} partidas/s)")
+
+
+if __name__ == "__main__":
+    main()